@@ -1,4 +1,6 @@
-from tetris.tetris import dev_main
-
 if __name__ == "__main__":
+    # imported here so processes that re-import this script (the bot's
+    # spawned search workers) do not load the game
+    from tetris.tetris import dev_main
+
     dev_main()
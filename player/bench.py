@@ -0,0 +1,363 @@
+"""
+Benchmarks for the engine, observation and bot hot paths.
+
+Every case runs on the saved boards in `player/bench_boards.json` (mid-game
+positions taken from seeded self-play), times each call on its own and
+reports ops/sec with p50/p99 latency:
+
+    python -m player.bench                           # run and print the report
+    python -m player.bench --save bench_baseline.json
+    python -m player.bench --compare bench_baseline.json --threshold 0.2
+
+With --compare, a case whose ops/sec dropped or whose p50 grew by more than
+the threshold is flagged and the exit status is 1. Baselines are only
+comparable on the same machine. `--make-corpus` regenerates the boards,
+playing the games with the tuned weights in `player/weights.json` (found by
+player/tune.py; the canonical El-Tetris weights top out too early to give
+a full corpus):
+
+    python -m player.bench --make-corpus
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from tetris.bitboard import BitboardTetris
+from tetris.engine import shape, tetris
+
+from . import bot
+from .observation import Grid, build_observation
+from .selfplay import percentiles
+from .transposition import TranspositionTable
+
+CORPUS = __file__.rsplit(".", 1)[0] + "_boards.json"
+TUNED_WEIGHTS = os.path.join(os.path.dirname(__file__), "weights.json")
+
+# ----------------- Corpus -----------------
+def make_corpus(games: int = 8, max_pieces: int = 240, every: int = 8, seed: int = 0,
+                weights=TUNED_WEIGHTS) -> list:
+    """
+    Snapshot every `every`-th spawn of `games` seeded bot games of at most
+    `max_pieces` pieces, played with `weights`. Each board is stored with
+    rows as digit strings (colours 0-4), the falling piece at its spawn
+    position, the next piece type and the cells the bot dropped the piece
+    on.
+    """
+    if weights is not None:
+        bot.load_weights(weights)
+    tt = TranspositionTable()
+    boards = []
+
+    def record(game, placed):
+        fig = game.fig
+        boards.append({
+            "rows": ["".join(str(v) for v in row) for row in game.grid],
+            "piece": {"type": fig.type, "rotation": fig.rotation, "color": fig.color,
+                      "x": fig.x, "y": fig.y},
+            "next": game.next.type,
+            "placed": placed,
+        })
+
+    for g in range(games):
+        game = tetris(seed=seed + g)
+        pieces = 0
+        while not game.end and pieces < max_pieces:
+            grid = game.grid
+            best = bot.best_placement(grid, {"type": game.fig.type}, None, tt)
+            if best is None:
+                break
+            rot_idx, x, _ = best
+            geo = bot.GEOMETRY[game.fig.type][rot_idx]
+            tops = bot.column_tops(grid)
+            y = min(tops[x + dx] - 1 - dy for dx, dy in geo.bottom)
+            placed = [[y + dy, x + dx] for dy, dx in geo.cells]
+            if pieces % every == 0:
+                record(game, placed)
+            game.fig.rotation, game.fig.x = rot_idx, x
+            game.touch()
+            if game.collision():
+                break
+            game.freefall()
+            pieces += 1
+    return boards
+
+
+def load_corpus(path: str = CORPUS) -> list:
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_game(board: dict, cls=tetris):
+    """A game of class `cls` in the position stored in `board`, dealing seeded pieces after it."""
+    game = cls(seed=0)
+    game.grid = [[int(v) for v in row] for row in board["rows"]]
+    game.fig = _piece(board["piece"])
+    game.next = _piece({"type": board["next"], "rotation": 0, "color": 1, "x": 5, "y": 0})
+    game.touch(board=True)
+    return game
+
+
+def _piece(data: dict):
+    fig = shape(data["x"], data["y"], data["type"], data["color"])
+    fig.rotation = data["rotation"]
+    return fig
+
+
+# ----------------- Cases -----------------
+# Each case maps the corpus to prepare(i), which gets everything the i-th
+# call needs ready (untimed) and returns the zero-argument call to time.
+
+def _engine_cases(name, cls):
+    def collision(corpus):
+        games = [load_game(b, cls) for b in corpus]
+        return lambda i: games[i % len(games)].collision
+
+    def remove_row(corpus):
+        # the board right after freeze() wrote the piece, before the clear
+        games = [load_game(b, cls) for b in corpus]
+        boards = []
+        for b, game in zip(corpus, games):
+            grid = game.grid
+            for r, c in b["placed"]:
+                grid[r][c] = b["piece"]["color"]
+            boards.append(grid)
+
+        def prepare(i):
+            game = games[i % len(games)]
+            game.grid = [row[:] for row in boards[i % len(games)]]
+            game.touch(board=True)
+            # freeze() keeps the row fill counts current, so count them untimed
+            game.row_fill()
+            return game.remove_row
+        return prepare
+
+    def freefall(corpus):
+        games = [load_game(b, cls) for b in corpus]
+        boards = [game.grid for game in games]
+
+        def prepare(i):
+            k = i % len(games)
+            game = games[k]
+            game.grid = [row[:] for row in boards[k]]
+            game.fig = _piece(corpus[k]["piece"])
+            game.end = False
+            game.touch(board=True)
+            game.row_fill()
+            return game.freefall
+        return prepare
+
+    return [
+        (name + ".collision", collision, 20000),
+        (name + ".remove_row", remove_row, 5000),
+        (name + ".freefall", freefall, 5000),
+    ]
+
+
+def _get_grid(corpus):
+    # a different game every call, so every observation is built from scratch
+    games = [load_game(b) for b in corpus]
+    helper = Grid()
+    return lambda i: lambda: helper.get_grid(games[i % len(games)])
+
+
+def _get_grid_piece_moved(corpus):
+    # the same game with the piece shifted between calls: board rows are reused
+    game = load_game(corpus[len(corpus) // 2])
+    helper = Grid()
+
+    def prepare(i):
+        game.fig.x += 1 if i % 2 else -1
+        game.touch()
+        return lambda: helper.get_grid(game)
+    return prepare
+
+
+def _get_grid_unchanged(corpus):
+    game = load_game(corpus[len(corpus) // 2])
+    helper = Grid()
+    return lambda i: lambda: helper.get_grid(game)
+
+
+def _enumerate_final_placements(corpus):
+    grids = [load_game(b).grid for b in corpus]
+    pieces = [{"type": b["piece"]["type"]} for b in corpus]
+    tt = TranspositionTable()
+
+    def prepare(i):
+        tt.clear()
+        k = i % len(grids)
+        return lambda: bot.enumerate_final_placements(grids[k], pieces[k], None, tt)
+    return prepare
+
+
+def _feature(fn):
+    def case(corpus):
+        grids = [load_game(b).grid for b in corpus]
+        return lambda i: lambda: fn(grids[i % len(grids)])
+    return case
+
+
+def _move_feature(fn):
+    def case(corpus):
+        placed = [[tuple(c) for c in b["placed"]] for b in corpus]
+        cleared = []
+        for b, cells in zip(corpus, placed):
+            grid = load_game(b).grid
+            for r, c in cells:
+                grid[r][c] = 1
+            cleared.append(sorted({r for r, _ in cells if all(grid[r])}))
+        if fn is bot.landing_height_avg:
+            return lambda i: lambda: fn(placed[i % len(placed)])
+        return lambda i: lambda: fn(placed[i % len(placed)], cleared[i % len(placed)])
+    return case
+
+
+def _decide(corpus):
+    # a cold decision: no plan and an empty table, searching with no deadline
+    player = bot.Bot(lookahead=True, search_ms=float("inf"), workers=0)
+    obs = [build_observation(load_game(b)) for b in corpus]
+
+    def prepare(i):
+        player.plan_key, player.plan = None, []
+        player.tt.clear()
+        return lambda: player.decide(obs[i % len(obs)])
+    return prepare
+
+
+CASES = (
+    _engine_cases("engine", tetris)
+    + _engine_cases("bitboard", BitboardTetris)
+    + [
+        ("Grid.get_grid", _get_grid, 20000),
+        ("Grid.get_grid.piece_moved", _get_grid_piece_moved, 20000),
+        ("Grid.get_grid.unchanged", _get_grid_unchanged, 20000),
+        ("enumerate_final_placements", _enumerate_final_placements, 500),
+        ("landing_height_avg", _move_feature(bot.landing_height_avg), 20000),
+        ("rows_eliminated_feature", _move_feature(bot.rows_eliminated_feature), 20000),
+        ("row_transitions", _feature(bot.row_transitions), 5000),
+        ("column_transitions", _feature(bot.column_transitions), 5000),
+        ("holes", _feature(bot.holes), 5000),
+        ("well_sums", _feature(bot.well_sums), 5000),
+        ("Bot.decide", _decide, 200),
+    ]
+)
+
+
+# ----------------- Runner -----------------
+def time_case(prepare, ops: int, warmup: int = 0) -> dict:
+    for i in range(warmup):
+        prepare(i)()
+    timer = time.perf_counter
+    times = []
+    for i in range(ops):
+        call = prepare(i)
+        t0 = timer()
+        call()
+        times.append(timer() - t0)
+    total = sum(times)
+    us = percentiles([t * 1e6 for t in times], (50, 99))
+    return {
+        "ops": ops,
+        "ops_per_sec": ops / total if total else float("inf"),
+        "mean_us": total * 1e6 / ops,
+        "p50_us": us["p50"],
+        "p99_us": us["p99"],
+    }
+
+
+def run(selected=None, scale: float = 1.0, corpus=None) -> dict:
+    """Time every case whose name contains one of `selected` (all by default)."""
+    corpus = corpus if corpus is not None else load_corpus()
+    results = {}
+    for name, case, ops in CASES:
+        if selected and not any(s in name for s in selected):
+            continue
+        n = max(1, int(ops * scale))
+        results[name] = time_case(case(corpus), n, warmup=min(n, 50))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "numpy": bot.np is not None,
+            "boards": len(corpus),
+            "scale": scale,
+        },
+        "cases": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """Names of the cases in both reports that got slower than `threshold` allows."""
+    regressions = []
+    for name, now in report["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        slower = now["ops_per_sec"] < before["ops_per_sec"] * (1 - threshold)
+        if slower or now["p50_us"] > before["p50_us"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def _format(report: dict, baseline=None, regressions=()) -> str:
+    lines = ["%-32s %12s %10s %10s" % ("case", "ops/sec", "p50 us", "p99 us")]
+    for name, r in report["cases"].items():
+        line = "%-32s %12.0f %10.2f %10.2f" % (name, r["ops_per_sec"], r["p50_us"], r["p99_us"])
+        before = baseline and baseline["cases"].get(name)
+        if before:
+            line += "  %+6.1f%%" % (100 * (r["ops_per_sec"] / before["ops_per_sec"] - 1))
+            if name in regressions:
+                line += "  REGRESSION"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the engine, observation and bot hot paths.")
+    parser.add_argument("cases", nargs="*", help="only run cases whose name contains one of these")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every case's op count")
+    parser.add_argument("--save", help="write the report as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown before a case is flagged")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--make-corpus", action="store_true",
+                        help="regenerate %s and exit" % CORPUS)
+    parser.add_argument("--weights", default=TUNED_WEIGHTS,
+                        help="weights for the corpus games (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.make_corpus:
+        boards = make_corpus(weights=args.weights)
+        with open(CORPUS, "w") as f:
+            json.dump(boards, f, separators=(",", ":"))
+            f.write("\n")
+        print("%d boards written to %s" % (len(boards), CORPUS))
+        return
+
+    report = run(args.cases, args.scale)
+    baseline = regressions = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        report["regressions"] = regressions
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(_format(report, baseline, regressions or ()))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
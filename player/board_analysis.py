@@ -0,0 +1,245 @@
+"""
+Incremental El-Tetris features.
+
+`BoardAnalysis` keeps a board as row and column bitmasks together with the
+per-row and per-column statistics the El-Tetris features are built from
+(fill counts, transitions, column heights, holes and well sums). Scoring a
+placement only recomputes the rows and columns the piece touches, and so do
+apply()/undo() for placements that clear nothing, which is what deeper
+searches need to stay cheap. A line clear shifts every column, so apply()
+then rebuilds the row lists and all column statistics, O(rows + cols); its
+undo() just swaps the old lists back in.
+
+The features are defined exactly like the functions in `player/bot.py`, so
+the two can be used interchangeably.
+"""
+from typing import List, Tuple
+
+
+def _popcount(x: int) -> int:
+    return bin(x).count("1")
+
+
+def _transitions(mask: int) -> int:
+    # bit i of mask ^ (mask << 1) is set when cell i differs from cell i-1,
+    # with the empty border on both ends counted like bot.row_transitions does
+    return _popcount(mask ^ (mask << 1))
+
+
+def _column_stats(mask: int, n_rows: int) -> Tuple[int, int, int]:
+    """(height, transitions, holes) of a column mask with bit r set for a filled row r."""
+    if not mask:
+        return 0, 0, 0
+    height = n_rows - ((mask & -mask).bit_length() - 1)
+    return height, _transitions(mask), height - _popcount(mask)
+
+
+def _run_sums(mask: int) -> int:
+    """Sum of 1 + 2 + ... + n over every run of n consecutive set bits."""
+    total = 0
+    while mask:
+        low = mask & -mask
+        above = (mask + low) & ~mask
+        n = above.bit_length() - low.bit_length()
+        total += n * (n + 1) // 2
+        mask ^= above - low
+    return total
+
+
+def _remove_row(mask: int, r: int) -> int:
+    """Drop bit r from a column mask, shifting the rows above it down by one."""
+    below = mask & ~((1 << (r + 1)) - 1)
+    above = mask & ((1 << r) - 1)
+    return below | (above << 1)
+
+
+class BoardAnalysis:
+    """
+    El-Tetris statistics of one board, kept up to date as pieces are placed.
+
+    Rows are indexed top to bottom like the grid. `row_masks[r]` has bit c
+    set when (r, c) is filled and `col_masks[c]` has bit r set.
+    """
+
+    def __init__(self, grid: List[List[int]]) -> None:
+        self.n_rows = len(grid)
+        self.n_cols = len(grid[0])
+        self.full_row = (1 << self.n_cols) - 1
+        self.full_col = (1 << self.n_rows) - 1
+
+        self.row_masks = [0] * self.n_rows
+        self.col_masks = [0] * self.n_cols
+        for r, row in enumerate(grid):
+            for c, cell in enumerate(row):
+                if cell != 0:
+                    self.row_masks[r] |= 1 << c
+                    self.col_masks[c] |= 1 << r
+
+        self.fill = [_popcount(m) for m in self.row_masks]
+        self.row_trans = [_transitions(m) for m in self.row_masks]
+        # rows that were already full are cleared by the next placement
+        self.full_rows = {r for r, m in enumerate(self.row_masks) if m == self.full_row}
+        self._refresh_columns()
+
+    def _refresh_columns(self) -> None:
+        stats = [_column_stats(m, self.n_rows) for m in self.col_masks]
+        self.heights = [s[0] for s in stats]
+        self.col_trans = [s[1] for s in stats]
+        self.holes = [s[2] for s in stats]
+        self.wells = [self._well_sum(c, {}) for c in range(self.n_cols)]
+
+        self.row_transitions = sum(self.row_trans)
+        self.column_transitions = sum(self.col_trans)
+        self.hole_count = sum(self.holes)
+        self.well_sum = sum(self.wells)
+
+    def _well_sum(self, c: int, changed: dict) -> int:
+        """Well sum of column c, with column masks in `changed` taking precedence."""
+        masks = self.col_masks
+        mask = changed.get(c, masks[c])
+        left = changed.get(c - 1, masks[c - 1]) if c > 0 else self.full_col
+        right = changed.get(c + 1, masks[c + 1]) if c < self.n_cols - 1 else self.full_col
+        return _run_sums(~mask & left & right & self.full_col)
+
+    @staticmethod
+    def _split(cells):
+        rows_add = {}
+        cols_add = {}
+        for r, c in cells:
+            rows_add[r] = rows_add.get(r, 0) | (1 << c)
+            cols_add[c] = cols_add.get(c, 0) | (1 << r)
+        return rows_add, cols_add
+
+    def features(self) -> Tuple[int, int, int, int]:
+        """(row_transitions, column_transitions, holes, well_sums) of the current board."""
+        return self.row_transitions, self.column_transitions, self.hole_count, self.well_sum
+
+    def features_after(self, cells: List[Tuple[int, int]]) -> Tuple[float, int, int, int, int, int]:
+        """
+        The six El-Tetris features of the board after placing `cells` and
+        clearing full lines, without changing this board. Only the piece's
+        rows and columns (and their neighbours for wells) are recomputed,
+        unless the placement clears lines.
+        """
+        fh = sum(r for r, _ in cells) / len(cells)
+        rows_add, cols_add = self._split(cells)
+        row_masks = self.row_masks
+        if self.full_rows or any(row_masks[r] | add == self.full_row for r, add in rows_add.items()):
+            token = self.apply(cells)
+            cleared = token[1]
+            f2 = len(cleared) * sum(1 for r, _ in cells if r in cleared)
+            features = (fh, f2) + self.features()
+            self.undo(token)
+            return features
+
+        row_transitions = self.row_transitions
+        for r, add in rows_add.items():
+            row_transitions += _transitions(row_masks[r] | add) - self.row_trans[r]
+
+        changed = {c: self.col_masks[c] | add for c, add in cols_add.items()}
+        column_transitions = self.column_transitions
+        hole_count = self.hole_count
+        for c, mask in changed.items():
+            _, trans, holes = _column_stats(mask, self.n_rows)
+            column_transitions += trans - self.col_trans[c]
+            hole_count += holes - self.holes[c]
+
+        well_sum = self.well_sum
+        for c in {k for c in changed for k in (c - 1, c, c + 1) if 0 <= k < self.n_cols}:
+            well_sum += self._well_sum(c, changed) - self.wells[c]
+
+        return fh, 0, row_transitions, column_transitions, hole_count, well_sum
+
+    def apply(self, cells: List[Tuple[int, int]]):
+        """
+        Place `cells` on the board and clear full lines. Returns a token for
+        undo(); its second item is the set of cleared rows (indices before
+        the clear).
+        """
+        rows_add, cols_add = self._split(cells)
+        full_row = self.full_row
+        cleared = {r for r, add in rows_add.items() if self.row_masks[r] | add == full_row}
+        cleared |= self.full_rows
+
+        if cleared:
+            # every column shifts, so swap in fresh lists and keep the old ones for undo
+            saved = (self.row_masks, self.fill, self.row_trans, self.col_masks,
+                     self.heights, self.col_trans, self.holes, self.wells, self.full_rows,
+                     self.row_transitions, self.column_transitions,
+                     self.hole_count, self.well_sum)
+            row_masks = self.row_masks[:]
+            row_trans = self.row_trans[:]
+            for r, add in rows_add.items():
+                row_masks[r] |= add
+                row_trans[r] = _transitions(row_masks[r])
+            keep = [r for r in range(self.n_rows) if r not in cleared]
+            empty = [0] * len(cleared)
+            self.row_masks = empty + [row_masks[r] for r in keep]
+            self.fill = empty + [self.fill[r] + _popcount(rows_add.get(r, 0)) for r in keep]
+            self.row_trans = empty + [row_trans[r] for r in keep]
+
+            col_masks = []
+            for c, mask in enumerate(self.col_masks):
+                mask |= cols_add.get(c, 0)
+                # top row first: removing a row shifts only the rows above it
+                for r in sorted(cleared):
+                    mask = _remove_row(mask, r)
+                col_masks.append(mask)
+            self.col_masks = col_masks
+            self.full_rows = set()
+            self._refresh_columns()
+            return ("cleared", cleared, saved)
+
+        saved_rows = [(r, self.row_masks[r], self.fill[r], self.row_trans[r]) for r in rows_add]
+        saved_cols = [(c, self.col_masks[c], self.heights[c], self.col_trans[c], self.holes[c])
+                      for c in cols_add]
+        well_cols = {k for c in cols_add for k in (c - 1, c, c + 1) if 0 <= k < self.n_cols}
+        saved_wells = [(c, self.wells[c]) for c in well_cols]
+        saved_totals = self.features()
+
+        for r, add in rows_add.items():
+            mask = self.row_masks[r] | add
+            self.row_masks[r] = mask
+            self.fill[r] = _popcount(mask)
+            trans = _transitions(mask)
+            self.row_transitions += trans - self.row_trans[r]
+            self.row_trans[r] = trans
+        for c, add in cols_add.items():
+            mask = self.col_masks[c] | add
+            self.col_masks[c] = mask
+            height, trans, holes = _column_stats(mask, self.n_rows)
+            self.heights[c] = height
+            self.column_transitions += trans - self.col_trans[c]
+            self.col_trans[c] = trans
+            self.hole_count += holes - self.holes[c]
+            self.holes[c] = holes
+        for c in well_cols:
+            wells = self._well_sum(c, {})
+            self.well_sum += wells - self.wells[c]
+            self.wells[c] = wells
+        return ("placed", cleared, (saved_rows, saved_cols, saved_wells, saved_totals))
+
+    def undo(self, token) -> None:
+        """Revert the apply() call that returned `token`. Tokens must be undone newest first."""
+        kind, _, saved = token
+        if kind == "cleared":
+            (self.row_masks, self.fill, self.row_trans, self.col_masks,
+             self.heights, self.col_trans, self.holes, self.wells, self.full_rows,
+             self.row_transitions, self.column_transitions,
+             self.hole_count, self.well_sum) = saved
+            return
+
+        saved_rows, saved_cols, saved_wells, saved_totals = saved
+        for r, mask, fill, trans in saved_rows:
+            self.row_masks[r] = mask
+            self.fill[r] = fill
+            self.row_trans[r] = trans
+        for c, mask, height, trans, holes in saved_cols:
+            self.col_masks[c] = mask
+            self.heights[c] = height
+            self.col_trans[c] = trans
+            self.holes[c] = holes
+        for c, wells in saved_wells:
+            self.wells[c] = wells
+        (self.row_transitions, self.column_transitions,
+         self.hole_count, self.well_sum) = saved_totals
@@ -1,9 +1,23 @@
 # paste this in place of your previous version
 
+import json
+import os
+import time
 from typing import List, Tuple, Optional
 from copy import deepcopy
 from math import inf
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tetris.engine import GEOMETRY, make_geometry
+
+from .board_analysis import BoardAnalysis
+from .trace import DecisionTracer
+from .transposition import TranspositionTable, zobrist_for
+
 # --- El-Tetris weights (canonical) ---
 WEIGHTS = {
     "landing_height": -4.500158825082766,
@@ -14,18 +28,44 @@ WEIGHTS = {
     "well_sums": -3.3855972247263626,
 }
 
+def load_weights(source):
+    """
+    Update WEIGHTS in place from a dict or from a JSON file such as the one
+    written by player/tune.py. Names that are left out keep their value.
+    """
+    if isinstance(source, str):
+        with open(source) as f:
+            source = json.load(f)
+    unknown = set(source) - set(WEIGHTS)
+    if unknown:
+        raise ValueError("unknown weights: " + ", ".join(sorted(unknown)))
+    WEIGHTS.update({name: float(value) for name, value in source.items()})
+
+# sentinel for transposition table lookups whose cached value may be None
+_MISSING = object()
+
 # ----------------- Grid helpers -----------------
 def copy_grid(grid):
     return [row[:] for row in grid]
 
-def collides(grid, cells: List[Tuple[int,int]]) -> bool:
-    for row, col in cells:
-        newrow = row+1
-        if newrow >= 19:
-            return True
-        if grid[newrow][col] != 0 and grid[newrow][col] != grid[row][col]:
-            return True
-    return False
+def without_piece(grid, cells: List[Tuple[int,int]]):
+    """Copy of `grid` with the falling piece's cells (overlaid by Grid.get_grid) cleared."""
+    g = copy_grid(grid)
+    for r, c in cells:
+        if 0 <= r < len(g) and 0 <= c < len(g[0]):
+            g[r][c] = 0
+    return g
+
+def column_tops(grid) -> List[int]:
+    """Row of the highest filled cell in each column (len(grid) for an empty column)."""
+    n_rows = len(grid)
+    tops = []
+    for c in range(len(grid[0])):
+        r = 0
+        while r < n_rows and grid[r][c] == 0:
+            r += 1
+        tops.append(r)
+    return tops
 
 def place_piece(grid: List[List[int]], cells: List[Tuple[int,int]], val: int = 1) -> Optional[List[List[int]]]:
     """
@@ -160,6 +200,15 @@ def well_sums(grid):
 
     return total
 
+def eltetris_score(fh, f2, f3, f4, f5, f6):
+    """Weighted El-Tetris score; works on plain numbers and NumPy arrays alike."""
+    return (WEIGHTS["landing_height"] * fh
+            + WEIGHTS["rows_eliminated"] * f2
+            + WEIGHTS["row_transitions"] * f3
+            + WEIGHTS["col_transitions"] * f4
+            + WEIGHTS["holes"] * f5
+            + WEIGHTS["well_sums"] * f6)
+
 def evaluate_eltetris(grid_after, placed_cells, cleared_rows):
     fh = landing_height_avg(placed_cells)
     f2 = rows_eliminated_feature(placed_cells, cleared_rows)
@@ -167,14 +216,54 @@ def evaluate_eltetris(grid_after, placed_cells, cleared_rows):
     f4 = column_transitions(grid_after)
     f5 = holes(grid_after)
     f6 = well_sums(grid_after)
-    score = (WEIGHTS["landing_height"] * fh
-             + WEIGHTS["rows_eliminated"] * f2
-             + WEIGHTS["row_transitions"] * f3
-             + WEIGHTS["col_transitions"] * f4
-             + WEIGHTS["holes"] * f5
-             + WEIGHTS["well_sums"] * f6)
-    print(score)
-    return score
+    return eltetris_score(fh, f2, f3, f4, f5, f6)
+
+def evaluate_eltetris_batch(grid, placed_cells_list, features = None):
+    """
+    Score many placements on the same `grid` at once with NumPy.
+    - placed_cells_list: N lists of placed (row, col) cells, all the same length.
+    - features: optional list; the six features of every placement are appended.
+    Returns an (N,) float array; entry i equals evaluate_eltetris for the board
+    after placing placed_cells_list[i] and clearing full lines.
+    """
+    cells = np.asarray(placed_cells_list, dtype=np.intp)
+    n = len(cells)
+    piece_rows, piece_cols = cells[..., 0], cells[..., 1]
+    ids = np.arange(n)[:, None]
+
+    # (N, rows, cols) boolean boards with each candidate placed
+    boards = np.repeat((np.asarray(grid) != 0)[None], n, axis=0)
+    boards[ids, piece_rows, piece_cols] = True
+    n_rows = boards.shape[1]
+
+    full = boards.all(axis=2)
+    n_cleared = full.sum(axis=1)
+    fh = piece_rows.sum(axis=1) / cells.shape[1]
+    f2 = n_cleared * full[ids, piece_rows].sum(axis=1)
+
+    # clear lines: stable-sort full rows to the top, then empty them
+    order = np.argsort(~full, axis=1, kind="stable")
+    boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+    boards[np.arange(n_rows)[None, :] < n_cleared[:, None]] = False
+
+    # transitions count the empty border on both ends of every row / column
+    padded = np.pad(boards, ((0, 0), (0, 0), (1, 1)))
+    f3 = (padded[:, :, 1:] != padded[:, :, :-1]).sum(axis=(1, 2))
+    padded = np.pad(boards, ((0, 0), (1, 1), (0, 0)))
+    f4 = (padded[:, 1:, :] != padded[:, :-1, :]).sum(axis=(1, 2))
+
+    f5 = (np.logical_or.accumulate(boards, axis=1) & ~boards).sum(axis=(1, 2))
+
+    # well cells are empty with a filled cell (or wall) on both sides; each one
+    # adds the depth of the run of well cells it ends
+    walls = np.pad(boards, ((0, 0), (0, 0), (1, 1)), constant_values=True)
+    wells = ~boards & walls[:, :, :-2] & walls[:, :, 2:]
+    run = np.cumsum(wells, axis=1)
+    f6 = (run - np.maximum.accumulate(np.where(wells, 0, run), axis=1)).sum(axis=(1, 2))
+
+    if features is not None:
+        features.extend(list(f) for f in zip(*(a.tolist() for a in (fh, f2, f3, f4, f5, f6))))
+    return eltetris_score(fh, f2, f3, f4, f5, f6)
 
 # ------------- Piece rotation helpers -------------
 def normalize_cells(cells: List[Tuple[int,int]]) -> List[Tuple[int,int]]:
@@ -207,44 +296,261 @@ def ensure_relative_shape(cells: List[Tuple[int,int]]) -> List[Tuple[int,int]]:
     min_c = min(c for _, c in cells)
     return sorted(((r - min_r, c - min_c) for r, c in cells))
 
+def piece_rotations(piece):
+    """
+    Geometry of every rotation of `piece`, in the engine's rotation order.
+    Known piece types come straight from the engine's GEOMETRY table, so
+    rotation indices and x positions match the ones the engine reports.
+    """
+    if piece.get("type") in GEOMETRY:
+        return GEOMETRY[piece["type"]]
+    if "rotations" in piece and piece["rotations"]:
+        return [make_geometry(normalize_cells(rot)) for rot in piece["rotations"]]
+    base_cells = ensure_relative_shape(piece.get("cells", []))
+    return [make_geometry(rot) for rot in generate_rotations_from_cells(base_cells)]
+
 # -------------- Placement enumeration & simulation ----------------
-def enumerate_final_placements(grid, piece, rotations = None):
-    n_rows = len(grid)
+def enumerate_landings(grid, rotations):
+    """Every (rot_idx, rot, x, placed_cells) a hard drop from above the stack can reach."""
     n_cols = len(grid[0])
+    tops = column_tops(grid)
+    landings = []
+    for rot_idx, geo in enumerate(rotations):
+        rot = geo.cells
+        for x in range(-geo.min_dx, n_cols - geo.max_dx):
+            # the piece comes to rest on the highest stack cell under any of its columns
+            y = min(tops[x + dx] - 1 - dy for dx, dy in geo.bottom)
+            if y + geo.min_dy < 0:
+                continue
+            landings.append((rot_idx, rot, x, [(y + dy, x + dx) for dy, dx in rot]))
+    return landings
 
+def enumerate_final_placements(grid, piece, rotations = None, tt = None):
+    """
+    Every reachable placement as (rot_idx, rot, x, placed_cells, new_grid,
+    cleared_rows, score). With a TranspositionTable `tt`, the board features
+    of each resulting grid are memoized under its Zobrist hash, so a board
+    reached again costs one lookup instead of four full scans.
+    """
     # build rotations only if not provided
     if rotations is None:
-        if "rotations" in piece and piece["rotations"]:
-            rotations = [normalize_cells(rot) for rot in piece["rotations"]]
-        else:
-            base_cells = piece.get("cells", [])
-            base_cells = ensure_relative_shape(base_cells)
-            rotations = generate_rotations_from_cells(base_cells)
+        rotations = piece_rotations(piece)
+    if tt is not None:
+        zobrist = zobrist_for(grid)
+        board_hash = zobrist.hash_grid(grid)
 
     placements = []
-    for rot_idx, rot in enumerate(rotations):
-        max_r = max(r for r, _ in rot)
-        max_c = max(c for _, c in rot)
-        min_x = 0
-        max_x = n_cols - (max_c + 1)
-        for x in range(min_x, max_x + 1):
-            drop = 0
-            while True:
-                test_cells = [(r + drop + 1, c + x) for r, c in rot]
-                if collides(grid, test_cells):
-                    break
-                drop += 1
-                if drop > n_rows:
-                    break
-            placed_cells = [(r + drop, c + x) for r, c in rot]
-            if collides(grid, placed_cells):
-                continue
-            new_grid = place_piece(grid, placed_cells, val=1)
-            new_grid, cleared_rows = clear_full_lines(new_grid)
+    for rot_idx, rot, x, placed_cells in enumerate_landings(grid, rotations):
+        new_grid = place_piece(grid, placed_cells, val=1)
+        new_grid, cleared_rows = clear_full_lines(new_grid)
+        if tt is None:
             score = evaluate_eltetris(new_grid, placed_cells, cleared_rows)
-            placements.append((rot_idx, rot, x, placed_cells, new_grid, cleared_rows, score))
+        else:
+            if cleared_rows:
+                key = ("features", zobrist.hash_grid(new_grid))
+            else:
+                key = ("features", zobrist.toggle(board_hash, placed_cells))
+            features = tt.get(key)
+            if features is None:
+                features = (row_transitions(new_grid), column_transitions(new_grid),
+                            holes(new_grid), well_sums(new_grid))
+                tt.put(key, features)
+            score = eltetris_score(landing_height_avg(placed_cells),
+                                   rows_eliminated_feature(placed_cells, cleared_rows),
+                                   *features)
+        placements.append((rot_idx, rot, x, placed_cells, new_grid, cleared_rows, score))
     return placements
 
+def best_placement(grid, piece, rotations = None, tt = None, board_hash = None, trace = None):
+    """
+    (rot_idx, x, score) of the best-scoring placement, or None if the piece
+    cannot be placed. Scores all candidates in one NumPy batch when numpy is
+    installed, otherwise scores them one by one from a BoardAnalysis.
+    With a TranspositionTable `tt` the result is memoized per board and piece.
+    With a `trace` dict the candidates scored are recorded in it, see
+    record_candidates(); nothing is recorded for a memoized result.
+    """
+    if rotations is None:
+        rotations = piece_rotations(piece)
+
+    if tt is not None:
+        if board_hash is None:
+            board_hash = zobrist_for(grid).hash_grid(grid)
+        key = ("best", board_hash, piece.get("type") or tuple(geo.cells for geo in rotations))
+        best = tt.get(key, _MISSING)
+        if best is _MISSING:
+            best = best_placement(grid, piece, rotations, trace=trace)
+            tt.put(key, best)
+        return best
+
+    landings = enumerate_landings(grid, rotations)
+    if not landings:
+        return None
+
+    scores = record_candidates(trace, grid, landings)
+    i = max(range(len(scores)), key=scores.__getitem__)
+    return landings[i][0], landings[i][2], scores[i]
+
+def score_landings(grid, landings, features = None):
+    """
+    El-Tetris score of every landing from enumerate_landings, in order. Uses
+    one NumPy batch when numpy is installed, otherwise a BoardAnalysis.
+    The six features of every landing are appended to `features` if given.
+    """
+    if np is None:
+        analysis = BoardAnalysis(grid)
+        scores = []
+        for _, _, _, cells in landings:
+            f = analysis.features_after(cells)
+            if features is not None:
+                features.append(list(f))
+            scores.append(eltetris_score(*f))
+        return scores
+    return evaluate_eltetris_batch(grid, [cells for _, _, _, cells in landings], features).tolist()
+
+def record_candidates(trace, grid, landings):
+    """
+    score_landings(), also recording into the decision `trace` dict (if not
+    None) every landing as [rot_idx, x, score] under "candidates" and, if
+    the trace has a "features" list, the features of each.
+    """
+    if trace is None:
+        return score_landings(grid, landings)
+    scores = score_landings(grid, landings, trace.get("features"))
+    trace["candidates"] = [[rot_idx, x, score] for (rot_idx, _, x, _), score
+                           in zip(landings, scores)]
+    return scores
+
+def rank_landings(grid, rotations, trace = None):
+    """
+    [(landing, score), ...] for every landing, best first (ties keep
+    enumeration order). A `trace` dict records them, see record_candidates().
+    """
+    landings = enumerate_landings(grid, rotations)
+    if not landings:
+        return []
+    scores = record_candidates(trace, grid, landings)
+    order = sorted(range(len(landings)), key=lambda i: -scores[i])
+    return [(landings[i], scores[i]) for i in order]
+
+def move_terms(placed_cells, cleared_rows):
+    """
+    Landing-height and rows-eliminated part of a placement's score. In a
+    two-piece line these are kept for the first placement, while its board
+    terms are superseded by the second placement's.
+    """
+    return (WEIGHTS["landing_height"] * landing_height_avg(placed_cells)
+            + WEIGHTS["rows_eliminated"] * rows_eliminated_feature(placed_cells, cleared_rows))
+
+def could_clear(analysis, n_cells = 4):
+    """
+    Whether dropping a piece of `n_cells` cells could complete a row: one
+    with at most n_cells gaps, all within n_cells adjacent columns and each
+    open from above, so a dropped piece can reach it. A row that is already
+    full counts too, since the next placement clears it.
+    """
+    full_row = analysis.full_row
+    col_masks = analysis.col_masks
+    for r, mask in enumerate(analysis.row_masks):
+        gaps = full_row & ~mask
+        if not gaps:
+            return True
+        if bin(gaps).count("1") > n_cells:
+            continue
+        if gaps.bit_length() - (gaps & -gaps).bit_length() >= n_cells:
+            continue
+        above = (1 << r) - 1
+        if all(not col_masks[c] & above for c in range(analysis.n_cols) if gaps >> c & 1):
+            return True
+    return False
+
+def second_ply_bound(analysis, n_cells = 4):
+    """
+    Optimistic (upper) bound on the El-Tetris score of dropping any piece of
+    `n_cells` cells on the board in `analysis`; inf if it could clear a
+    line or the board already has a full one (see could_clear). Without a clear the piece rests on the stack,
+    so its cells sit between the highest landing row minus its height and
+    the deepest landing row; each cell moves the row transitions by at
+    most 2; column transitions and holes can only grow; and wells only
+    shrink in the n_cells adjacent columns the piece covers.
+    """
+    if could_clear(analysis, n_cells):
+        return inf
+    n_rows = analysis.n_rows
+    landing = [n_rows - h - 1 for h in analysis.heights]
+    rt, ct, n_holes, wells = analysis.features()
+    column_wells = analysis.wells
+    filled_wells = max(sum(column_wells[c:c + n_cells])
+                       for c in range(max(1, analysis.n_cols - n_cells + 1)))
+    ranges = {
+        "landing_height": (max(0, min(landing) - (n_cells - 1)), max(landing)),
+        "rows_eliminated": (0, 0),
+        "row_transitions": (max(0, rt - 2 * n_cells), rt + 2 * n_cells),
+        "col_transitions": (ct, ct + 2 * n_cells),
+        "holes": (n_holes, n_holes + n_cells * n_rows),
+        "well_sums": (wells - filled_wells, inf),
+    }
+    bound = 0.0
+    for name, (lo, hi) in ranges.items():
+        w = WEIGHTS[name]
+        if w > 0:
+            bound += w * hi
+        elif w < 0:
+            bound += w * lo
+    return bound
+
+def best_placement_lookahead(grid, piece, next_piece, rotations = None, top_k = 8,
+                             deadline = None, tt = None, trace = None):
+    """
+    Two-piece search. The current piece's placements are ranked by their own
+    score and the best `top_k` are expanded with every placement of
+    `next_piece`. A line is worth the score of its second placement (which
+    sees the final board) plus the landing-height and rows-eliminated terms
+    of the first.
+    Branches whose second_ply_bound cannot beat the best line so far are
+    skipped, and no new branch is started after `deadline`
+    (time.perf_counter()). Returns (rot_idx, x, value) like best_placement,
+    falling back to the one-piece result if no branch was searched. A
+    `trace` dict gets the first-ply candidates (see record_candidates()) and
+    every line searched as [rot_idx, x, value] under "lines".
+    """
+    if rotations is None:
+        rotations = piece_rotations(piece)
+
+    ranked = rank_landings(grid, rotations, trace)
+    if not ranked:
+        return None
+    (rot_idx, _, x, _), score = ranked[0]
+    greedy = (rot_idx, x, score)
+    if not next_piece:
+        return greedy
+
+    next_rotations = piece_rotations(next_piece)
+    analysis = BoardAnalysis(grid)
+    lines = trace.setdefault("lines", []) if trace is not None else None
+    best = None
+    for (rot_idx, _, x, cells), _ in ranked[:top_k]:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+
+        token = analysis.apply(cells)
+        bonus = move_terms(cells, token[1])
+        bound = second_ply_bound(analysis) + bonus
+        analysis.undo(token)
+        if best is not None and bound <= best[2]:
+            continue
+
+        new_grid, _ = clear_full_lines(place_piece(grid, cells))
+        second = best_placement(new_grid, next_piece, next_rotations, tt)
+        if second is None:
+            continue
+        value = second[2] + bonus
+        if lines is not None:
+            lines.append([rot_idx, x, value])
+        if best is None or value > best[2]:
+            best = (rot_idx, x, value)
+    return best or greedy
+
 # -------------- Action planner ----------------
 def compute_first_action(obs, target_rot_idx, target_x, rotations):
     piece = obs["current_piece"]
@@ -267,8 +573,8 @@ def compute_first_action(obs, target_rot_idx, target_x, rotations):
         cur_cells = piece["cells"]
         try:
             rel = ensure_relative_shape(cur_cells)
-            for i, rot in enumerate(rotations):
-                if rel == rot:
+            for i, geo in enumerate(rotations):
+                if rel == ensure_relative_shape(geo.cells):
                     curr_rot_idx = i
                     break
         except Exception:
@@ -285,31 +591,181 @@ def compute_first_action(obs, target_rot_idx, target_x, rotations):
         return 'd'
     return ' '
 
+def plan_keys(piece, target_rot_idx, target_x, n_rotations):
+    """
+    Keys that take `piece` from its observed rotation and x to the target:
+    rotations first, then shifts, then a hard drop. Returns a list of
+    (rotation, x, key) where (rotation, x) is where the piece should be when
+    `key` is pressed.
+    """
+    rot, x = piece["rotation"], piece["x"]
+    steps = []
+    while rot != target_rot_idx:
+        steps.append((rot, x, 'w'))
+        rot = (rot + 1) % n_rotations
+    while x != target_x:
+        key = 'd' if target_x > x else 'a'
+        steps.append((rot, x, key))
+        x += 1 if key == 'd' else -1
+    steps.append((rot, x, ' '))
+    return steps
+
 # ----------------- Main Bot class --------------------
 class Bot:
-    def __init__(self) -> None:
-        # any initialization/state goes here
-        pass
+    def __init__(self, tt_bytes: Optional[int] = None, lookahead: Optional[bool] = None,
+                 top_k: int = 8, search_ms: Optional[float] = None,
+                 workers: Optional[int] = None, weights = None,
+                 macro: Optional[bool] = None,
+                 tracer: Optional[DecisionTracer] = None) -> None:
+        # tuned weights: a dict or JSON file path, BOT_WEIGHTS by default.
+        # WEIGHTS is module-wide, so this affects every Bot in the process.
+        if weights is None:
+            weights = os.getenv("BOT_WEIGHTS") or None
+        if weights is not None:
+            load_weights(weights)
+        # memory cap of the transposition table, BOT_TT_MB megabytes by default
+        if tt_bytes is None:
+            try:
+                tt_bytes = int(os.getenv("BOT_TT_MB", "32")) * 1024 * 1024
+            except Exception:
+                tt_bytes = 32 * 1024 * 1024
+        self.tt = TranspositionTable(tt_bytes)
+        # two-piece search, limited to half of the BOT_INTERVAL_MS decision
+        # interval. Off unless BOT_LOOKAHEAD=1: it costs about 8x the time of
+        # the one-piece search and has not cleared more lines in self-play.
+        if lookahead is None:
+            lookahead = os.getenv("BOT_LOOKAHEAD") == "1"
+        self.lookahead = lookahead
+        self.top_k = top_k
+        if search_ms is None:
+            try:
+                search_ms = int(os.getenv("BOT_INTERVAL_MS", "120")) / 2
+            except Exception:
+                search_ms = 60
+        self.search_ms = search_ms
+        # optional process pool for the lookahead, BOT_WORKERS processes (0 = off)
+        if workers is None:
+            try:
+                workers = int(os.getenv("BOT_WORKERS", "0"))
+            except Exception:
+                workers = 0
+        self.parallel = None
+        if lookahead and workers > 0:
+            from .parallel import ParallelSearch
+            self.parallel = ParallelSearch(workers, tt_bytes, dict(WEIGHTS))
+        # answer with one ("place", rotation, x) macro per piece instead of
+        # single keys, BOT_MACRO=1 by default
+        if macro is None:
+            macro = os.getenv("BOT_MACRO") == "1"
+        self.macro = macro
+        # decision trace (see player/trace.py), set up from BOT_TRACE by default
+        if tracer is None:
+            tracer = DecisionTracer.from_env()
+        self.tracer = tracer
+        self.last_search = None
+        self.search_trace = None
+        # plan for the falling piece: keyed by (type, color, board hash),
+        # with the remaining steps from plan_keys
+        self.plan_key = None
+        self.plan = []
+
+    def close(self) -> None:
+        """Shut down the search worker processes, if any. The bot still decides afterwards, in-process."""
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
+    def __enter__(self) -> "Bot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
     def decide(self, obs: dict):
-        grid = obs["grid"]
+        tracer = self.tracer
+        if tracer is None or not tracer.sample():
+            return self._decide(obs)
+        start = time.perf_counter()
+        self.last_search = None
+        # levels 2 and 3: the search records what it scores into this dict
+        if tracer.level >= 2:
+            self.search_trace = {"features": []} if tracer.level >= 3 else {}
+        try:
+            action = self._decide(obs)
+        finally:
+            search_trace, self.search_trace = self.search_trace, None
+        elapsed = time.perf_counter() - start
+        if obs is not None and obs.get("current_piece") is not None:
+            self._trace(obs, action, elapsed, search_trace)
+        return action
+
+    def _trace(self, obs, action, elapsed, search_trace) -> None:
         piece = obs["current_piece"]
+        best = self.last_search
+        record = {
+            "piece": piece.get("type"),
+            "rotation": piece.get("rotation"),
+            "x": piece.get("x"),
+            "y": piece.get("y"),
+            "search": list(best) if best is not None else None,
+            "action": action,
+            "us": round(elapsed * 1e6),
+        }
+        # what the search scored; absent when it did not search (a planned
+        # key was replayed or the result came from the transposition table)
+        if search_trace:
+            for name in ("candidates", "features", "lines"):
+                if search_trace.get(name):
+                    record[name] = search_trace[name]
+        self.tracer.add(record)
+
+    def _decide(self, obs: dict):
+        if obs is None or obs.get("current_piece") is None:
+            return None
+        piece = obs["current_piece"]
+        grid = without_piece(obs["grid"], piece["cells"])
 
         # compute rotations once and pass them through
-        if "rotations" in piece and piece["rotations"]:
-            rotations = [normalize_cells(rot) for rot in piece["rotations"]]
-        else:
-            base_cells = piece.get("cells", [])
-            base_cells = ensure_relative_shape(base_cells)
-            rotations = generate_rotations_from_cells(base_cells)
-
-        placements = enumerate_final_placements(grid, piece, rotations)
-        if not placements:
+        rotations = piece_rotations(piece)
+
+        board_hash = zobrist_for(grid).hash_grid(grid)
+
+        if self.macro:
+            best = self._search(grid, piece, obs.get("next_piece"), rotations, board_hash)
+            return None if best is None else ("place", best[0], best[1])
+
+        if "rotation" not in piece or "x" not in piece:
+            best = self._search(grid, piece, obs.get("next_piece"), rotations, board_hash)
+            if best is None:
+                return None
+            return compute_first_action(obs, best[0], best[1], rotations)
+
+        # replay the cached plan while the piece is where the plan expects it
+        key = (piece.get("type"), piece.get("color"), board_hash)
+        if key == self.plan_key and self.plan:
+            rot, x, action = self.plan[0]
+            if (rot, x) == (piece["rotation"], piece["x"]):
+                self.plan.pop(0)
+                return action
+
+        best = self._search(grid, piece, obs.get("next_piece"), rotations, board_hash)
+        if best is None:
+            self.plan_key, self.plan = None, []
             return None
-
-        best = max(placements, key=lambda t: t[-1])
-        best_rot_idx, best_rot, best_x, _, _, _, _ = best
-
-        action = compute_first_action(obs, best_rot_idx, best_x, rotations)
-        return action
-        # print(collides(grid, piece["cells"]))
\ No newline at end of file
+        self.plan_key = key
+        self.plan = plan_keys(piece, best[0], best[1], len(rotations))
+        return self.plan.pop(0)[2]
+
+    def _search(self, grid, piece, next_piece, rotations, board_hash):
+        if self.lookahead and next_piece:
+            deadline = time.perf_counter() + self.search_ms / 1000
+            if self.parallel is not None:
+                best = self.parallel.search(grid, piece, next_piece, rotations,
+                                            self.top_k, deadline, self.search_trace)
+            else:
+                best = best_placement_lookahead(grid, piece, next_piece, rotations,
+                                                self.top_k, deadline, self.tt, self.search_trace)
+        else:
+            best = best_placement(grid, piece, rotations, self.tt, board_hash, self.search_trace)
+        self.last_search = best
+        return best
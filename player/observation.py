@@ -0,0 +1,101 @@
+"""
+Observations handed to bots.
+
+`Grid.get_grid` turns a game into the board / piece data described in
+`player/bot.py`, and `build_observation` wraps it into the `obs` dict that
+`Bot.decide` receives. Nothing here needs pygame, so headless runners use it
+directly.
+
+A `Grid` keeps the last observation it built and hands it back as long as
+the game's `generation` has not moved. When only the falling piece moved,
+the board rows are reused and just the rows under the piece are copied, so
+observations share row lists with each other: treat them as read-only.
+"""
+from tetris.engine import GEOMETRY
+
+
+class Grid:
+    def __init__(self):
+        self.game = None
+        self.generation = None
+        self.board_generation = None
+        self.board = None
+        self.next_piece = None
+        self.next_block = None
+        self.result = None
+        self.obs = None
+
+    def get_grid(self, tetris_game):
+        generation = getattr(tetris_game, "generation", None)
+        if generation is None:
+            # a game without change tracking: rebuild everything every time
+            self.game = None
+            return self._build(tetris_game, [row[:] for row in tetris_game.grid])
+        if tetris_game is self.game and generation == self.generation:
+            return self.result
+
+        if tetris_game is not self.game or tetris_game.board_generation != self.board_generation:
+            self.board = [row[:] for row in tetris_game.grid]
+            self.board_generation = tetris_game.board_generation
+        self.game = tetris_game
+        self.generation = generation
+        self.result = self._build(tetris_game, self.board[:])
+        self.obs = None
+        return self.result
+
+    def _build(self, tetris_game, grid_copy):
+        """Overlay the falling piece on `grid_copy`, copying only the rows it covers."""
+        current_block = None
+        next_block = None
+        if tetris_game.fig:
+            current_block = {
+                "type": tetris_game.fig.type,
+                "x": tetris_game.fig.x,
+                "y": tetris_game.fig.y,
+                "rotation": tetris_game.fig.rotation,
+                "color": tetris_game.fig.color,
+                "cells": [],
+            }
+            fig = tetris_game.fig
+            copied = set()
+            for i, j in GEOMETRY[fig.type][fig.rotation].cells:
+                r = fig.y + i
+                c = fig.x + j
+                current_block["cells"].append((r, c))
+                if 0 <= r < tetris_game.rows and 0 <= c < tetris_game.cols:
+                    if r not in copied:
+                        grid_copy[r] = grid_copy[r][:]
+                        copied.add(r)
+                    grid_copy[r][c] = fig.color
+
+        if tetris_game.next:
+            nxt = tetris_game.next
+            key = (nxt, nxt.rotation)
+            if key != self.next_piece:
+                self.next_piece = key
+                self.next_block = {
+                    "type": nxt.type,
+                    "rotation": nxt.rotation,
+                    "color": nxt.color,
+                    "cells": [],
+                }
+            next_block = self.next_block
+
+        return grid_copy, current_block, next_block, tetris_game.lvl
+
+    def observation(self, tetris_game) -> dict:
+        """get_grid() as the `obs` dict, cached along with it."""
+        result = self.get_grid(tetris_game)
+        if self.obs is None or self.game is None:
+            grid, current, next_piece, level = result
+            self.obs = {
+                "grid": grid,
+                "current_piece": current,
+                "next_piece": next_piece,
+                "level": level
+            }
+        return self.obs
+
+
+def build_observation(tetris_game, grid_helper=None) -> dict:
+    return (grid_helper or Grid()).observation(tetris_game)
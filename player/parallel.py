@@ -0,0 +1,148 @@
+"""
+Process-pool version of the bot's two-piece search.
+
+Each first-ply branch of `best_placement_lookahead` can be searched on its
+own, so `ParallelSearch` keeps a persistent pool of warmed-up worker
+processes and hands every expanded branch to one of them. Boards travel as
+tuples of row bitmasks rather than nested lists, and whatever has come back
+by the deadline is merged into the answer.
+"""
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+from tetris.engine import COLS, ROWS
+
+from .bot import (
+    best_placement,
+    load_weights,
+    clear_full_lines,
+    move_terms,
+    piece_rotations,
+    place_piece,
+    rank_landings,
+)
+from .transposition import TranspositionTable
+
+
+def pack_board(grid) -> Tuple[int, ...]:
+    """One int per row with bit c set when column c is filled."""
+    return tuple(sum(1 << c for c, cell in enumerate(row) if cell != 0) for row in grid)
+
+
+def unpack_board(rows, n_cols: int) -> List[List[int]]:
+    return [[(mask >> c) & 1 for c in range(n_cols)] for mask in rows]
+
+
+# per-worker state, set up by _warm_up
+_worker_tt = None
+
+
+def _warm_up(tt_bytes: int, weights: Optional[dict]) -> None:
+    """Pool initializer: build the worker's table and run one search so imports and caches are hot."""
+    global _worker_tt
+    if weights is not None:
+        load_weights(weights)
+    _worker_tt = TranspositionTable(tt_bytes)
+    best_placement([[0] * COLS for _ in range(ROWS)], {"type": "T"})
+
+
+def _second_ply(rows, n_cols: int, next_piece: dict) -> Optional[float]:
+    """Worker task: score of the best placement of `next_piece` on a packed board."""
+    best = best_placement(unpack_board(rows, n_cols), next_piece, None, _worker_tt)
+    return None if best is None else best[2]
+
+
+def _ready() -> bool:
+    return True
+
+
+class ParallelSearch:
+    """
+    Two-piece search with the second ply fanned out over `workers` processes.
+    The pool is started once and reused for every decision; call close()
+    when done with it.
+    """
+
+    def __init__(self, workers: Optional[int] = None, tt_bytes: int = 32 * 1024 * 1024,
+                 weights: Optional[dict] = None) -> None:
+        # spawn rather than fork: the parent may be running the decision
+        # thread and pygame. Spawned workers re-import the main script, which
+        # is why main.py only imports the game under its __main__ guard.
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+            initargs=(tt_bytes, weights),
+        )
+        # start every worker now instead of on the first decision
+        wait([self.pool.submit(_ready) for _ in range(self.workers)])
+        self.late = 0
+        # branches of searches still running, cancelled by close()
+        self.futures = set()
+
+    def search(self, grid, piece, next_piece, rotations=None, top_k: int = 8,
+               deadline: Optional[float] = None, trace: Optional[dict] = None):
+        """
+        Same contract as bot.best_placement_lookahead: returns (rot_idx, x,
+        value), or None if the piece cannot be placed. Branches that have not
+        finished by `deadline` (time.perf_counter()) are counted in `late`
+        and ignored. All branches are dispatched up front, so unlike the
+        sequential search there is no bound-based pruning. A `trace` dict
+        is filled like best_placement_lookahead's, with the lines that came
+        back in time.
+        """
+        if rotations is None:
+            rotations = piece_rotations(piece)
+
+        ranked = rank_landings(grid, rotations, trace)
+        if not ranked:
+            return None
+        (rot_idx, _, x, _), score = ranked[0]
+        greedy = (rot_idx, x, score)
+        if not next_piece:
+            return greedy
+
+        n_cols = len(grid[0])
+        branches = {}
+        for rank, ((rot_idx, _, x, cells), _) in enumerate(ranked[:top_k]):
+            new_grid, cleared = clear_full_lines(place_piece(grid, cells))
+            future = self.pool.submit(_second_ply, pack_board(new_grid), n_cols, next_piece)
+            branches[future] = (rank, rot_idx, x, move_terms(cells, cleared))
+        self.futures.update(branches)
+
+        lines = trace.setdefault("lines", []) if trace is not None else None
+        # (value, -rank) so equal lines resolve the same way as the sequential search
+        best = None
+        best_key = None
+        pending = set(branches)
+        while pending:
+            # an infinite deadline (search_ms=inf) waits like no deadline
+            timeout = None if deadline is None or deadline == float("inf") \
+                else max(0.0, deadline - time.perf_counter())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                second = future.result()
+                if second is None:
+                    continue
+                rank, rot_idx, x, bonus = branches[future]
+                value = second + bonus
+                if lines is not None:
+                    lines.append([rot_idx, x, value])
+                if best_key is None or (value, -rank) > best_key:
+                    best, best_key = (rot_idx, x, value), (value, -rank)
+        for future in pending:
+            future.cancel()
+        self.futures.difference_update(branches)
+        self.late += len(pending)
+        return best or greedy
+
+    def close(self) -> None:
+        # shutdown(cancel_futures=True) needs Python 3.9
+        for future in list(self.futures):
+            future.cancel()
+        self.pool.shutdown(wait=False)
@@ -1,77 +1,33 @@
+import os
+import time
+from collections import deque
 from typing import Optional
 
-try:
-    import pygame 
-except Exception: 
-    pygame = None 
-
-
-class Grid:
-    def get_grid(self, tetris_game):
-        grid_copy = [row[:] for row in tetris_game.grid]
-        current_block = None
-        next_block = None
-        if tetris_game.fig:
-            current_block = {
-                "type": tetris_game.fig.type,
-                "x": tetris_game.fig.x,
-                "y": tetris_game.fig.y,
-                "rotation": tetris_game.fig.rotation,
-                "color": tetris_game.fig.color,
-                "cells": [],
-            }
-            for i in range(4):
-                for j in range(4):
-                    if (i * 4 + j) in tetris_game.fig.img():
-                        r = tetris_game.fig.y + i
-                        c = tetris_game.fig.x + j
-                        current_block["cells"].append((r, c))
-                        if 0 <= r < tetris_game.rows and 0 <= c < tetris_game.cols:
-                            grid_copy[r][c] = tetris_game.fig.color
-
-        if tetris_game.next:
-            next_block = {
-                "type": tetris_game.next.type,
-                "rotation": tetris_game.next.rotation,
-                "color": tetris_game.next.color,
-                "cells": [], 
-            }
-
-        return grid_copy, current_block, next_block, tetris_game.lvl
-
-
-def _install_bot_key_injector():
-    if pygame is None:
-        return 
-
-    if getattr(_install_bot_key_injector, "_installed", False):
-        return
+from tetris.profiler import PROFILER
 
-    try:
-        from .bot import Bot
-    except Exception:
-        _install_bot_key_injector._installed = True
+from .observation import Grid, build_observation
+from .worker import DecisionWorker, decision_state
+
+# Actions for the running game, in the names engine.apply_action() accepts.
+# dev_main appends the player's key presses, bot_tick() the bot's decisions,
+# and dev_main drains it into game.step() once per frame.
+commands = deque()
+
+
+def _install_bot_controller():
+    if getattr(_install_bot_controller, "_installed", False):
         return
+    _install_bot_controller._installed = True
 
     try:
-        original_get_pressed = pygame.key.get_pressed
+        from .bot import Bot
     except Exception:
-        _install_bot_key_injector._installed = True
         return
 
-    KEYMAP = {
-        "w": getattr(pygame, "K_UP", 273),
-        "a": getattr(pygame, "K_LEFT", 276),
-        "s": getattr(pygame, "K_DOWN", 274),
-        "d": getattr(pygame, "K_RIGHT", 275),
-        " ": getattr(pygame, "K_SPACE", 32),
-    }
     try:
         bot = Bot()
     except Exception:
-        _install_bot_key_injector._installed = True
         return
-    import os
     interval_env = os.getenv("BOT_INTERVAL_MS")
     try:
         interval_ms = int(interval_env) if interval_env else 120
@@ -79,107 +35,93 @@ def _install_bot_key_injector():
         interval_ms = 120
 
     state = {
-        "active_key": None,     
-        "pulse_frames": 0,        
-        "last_decide_ms": 0,     
+        "last_decide": None,
         "interval_ms": interval_ms,
         "game_instance": None,
+        "ended": False,
     }
+    # reused across ticks so unchanged games cost a generation check
+    grid_helper = Grid()
 
-    def _update_action() -> None:
+    # TETRIS_PROFILE: time observations and decisions, on whichever thread decides
+    profiler = PROFILER
+    if profiler:
+        bot.decide = profiler.timed("decide", bot.decide)
+
+    # the bot runs on a background thread unless BOT_ASYNC=0
+    worker = None
+    if os.getenv("BOT_ASYNC", "1") != "0":
         try:
-            now = pygame.time.get_ticks() if pygame.get_init() else 0
+            worker = DecisionWorker(bot, interval_ms)
         except Exception:
-            now = 0
-        if now - state["last_decide_ms"] < state["interval_ms"]:
+            worker = None
+    global _worker
+    _worker = worker
+
+    def _push(action) -> None:
+        # decide() may return one action or a list of them for the same tick
+        if isinstance(action, list):
+            commands.extend(a for a in action if a is not None)
+        elif action is not None:
+            commands.append(action)
+
+    def tick() -> None:
+        game = state["game_instance"]
+        # write the decision trace out once per finished game
+        ended = bool(game is not None and game.end)
+        if ended and not state["ended"] and bot.tracer is not None:
+            bot.tracer.dump()
+        state["ended"] = ended
+        if worker is not None:
+            # pick up whatever the worker decided for the game as it is now
+            found, action = worker.poll(decision_state(game))
+            if found:
+                _push(action)
+
+        now = time.monotonic()
+        last = state["last_decide"]
+        if last is not None and (now - last) * 1000 < state["interval_ms"]:
             return
-        state["last_decide_ms"] = now
-        
+        state["last_decide"] = now
+        if profiler and last is not None and state["interval_ms"] > 0:
+            # decision points that passed without a decision
+            missed = int((now - last) * 1000 / state["interval_ms"]) - 1
+            if missed > 0:
+                profiler.count("missed_intervals", missed)
+
         obs = None
-        if state["game_instance"] is not None:
+        if game is not None:
             try:
-                grid_helper = Grid()
-                grid, current, next_piece, level = grid_helper.get_grid(state["game_instance"])
-                obs = {
-                    "grid": grid,
-                    "current_piece": current,
-                    "next_piece": next_piece,
-                    "level": level
-                }
-            except:
+                obs = build_observation(game, grid_helper)
+            except Exception:
                 pass
-        
-        try:
-            action = bot.decide(obs) 
-        except Exception:
-            action = None
+            if profiler:
+                profiler.add("observation", time.monotonic() - now)
 
-        keycode = KEYMAP.get(action) if isinstance(action, str) else None
-        if keycode is None:
-            state["active_key"] = None
-            state["pulse_frames"] = 0
+        if worker is not None:
+            if obs is not None:
+                worker.submit(obs, decision_state(game))
             return
 
-        state["active_key"] = keycode
-        if action == " ":
-            state["pulse_frames"] = 3
-        elif action in ("w", "a", "d", "s"):
-            state["pulse_frames"] = 5
-        else:
-            state["pulse_frames"] = 3
-
-    class _KeyStateProxy:
-        def __init__(self, base):
-            self._base = base
-
-        def __getitem__(self, idx):
-            try:
-                base_val = self._base[idx]
-            except Exception:
-                base_val = 0
-            if state["active_key"] is not None and idx == state["active_key"]:
-                return 1
-            return base_val
-
-        def __len__(self):
-            try:
-                return len(self._base)
-            except Exception:
-                return 0
-
-        def __iter__(self):
-            for i in range(len(self)):
-                yield self[i]
-
-    def injected_get_pressed():
         try:
-            base = original_get_pressed()
+            action = bot.decide(obs)
         except Exception:
-            return original_get_pressed()
-        _update_action()
-        if state["active_key"] is not None:
-            if state["pulse_frames"] > 0:
-                state["pulse_frames"] -= 1
-            if state["pulse_frames"] == 0:
-                state["active_key"] = None
-        return _KeyStateProxy(base)
-
-    # Swap in our injector
-    try:
-        pygame.key.get_pressed = injected_get_pressed
-    except Exception:
-        pass
+            action = None
+        _push(action)
 
-    _install_bot_key_injector._installed = True
-    
     def set_game_instance(game):
         state["game_instance"] = game
-    
-    return set_game_instance
+
+    global _bot
+    _bot = bot
+    return set_game_instance, tick
 
 _set_game_fn = None
+_tick_fn = None
+_worker = None
+_bot = None
 try:
-    _set_game_fn = _install_bot_key_injector()
+    _set_game_fn, _tick_fn = _install_bot_controller()
 except Exception:
     pass
 
@@ -188,4 +130,23 @@ def update_game_state(game):
         _set_game_fn(game)
 
 
+def bot_tick() -> None:
+    """
+    Run the bot for one frame: collect its finished decision into `commands`
+    and hand it a fresh observation every BOT_INTERVAL_MS.
+    """
+    if _tick_fn is not None:
+        _tick_fn()
+
+
+def decision_stats() -> Optional[dict]:
+    """Counters of the background decision worker (stale, gravity, late, ...), or None when deciding inline."""
+    return _worker.stats() if _worker is not None else None
+
 
+def close_bot() -> None:
+    """Stop the decision worker thread and the bot's search processes."""
+    if _worker is not None:
+        _worker.close()
+    if _bot is not None:
+        _bot.close()
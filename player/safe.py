@@ -382,7 +382,6 @@ class Bot:
 
             return total
 
-        print("Wells:",well_sums(grid))
 
         def score(grid, current_piece):
             return landing_height(grid, current_piece)*(-4500) + rows_eliminated(grid, current_piece["cells"])*(3418) + row_transitions(grid)*(-3218) + column_transitions(grid)*(-9349) + holes(grid)*(-7899) + well_sums(grid)*(-3386)
@@ -0,0 +1,202 @@
+"""
+Headless self-play runner.
+
+Plays N games of the headless engine with `player.bot.Bot` across a pool of
+worker processes and prints an aggregate JSON report:
+
+    python -m player.selfplay --games 200 --workers 16 --max-pieces 2000
+
+Game i is dealt the pieces of `PieceStream(--seed + i)`, so the same
+command plays the same games down to the piece. Every game is independent,
+so throughput scales with the number of workers. The bot search has no
+deadline by default, which keeps results reproducible; pass --search-ms to
+measure a time-limited bot. With --record DIR every worker process appends
+its games to a binary replay file in DIR (see tetris/replay.py).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import List, Optional
+
+from multiprocessing.util import Finalize
+
+from tetris.engine import PieceStream, tetris
+from tetris.replay import ReplayWriter
+
+from .bot import Bot
+from .observation import Grid, build_observation
+
+def play_game(seed: int, max_pieces: Optional[int] = None, gravity: int = 6,
+              bot_kwargs: Optional[dict] = None, bag: bool = False,
+              recorder: Optional[ReplayWriter] = None) -> dict:
+    """
+    Play one game to game over or `max_pieces` placed pieces. Every tick the
+    bot sees a fresh observation and its action goes through game.step();
+    the piece also falls one row every `gravity` ticks, roughly dev_main's
+    pace at level 1 with the default 120 ms decision interval. Pieces come
+    from a PieceStream seeded with `seed`, dealt in 7-bags if `bag` is set.
+    With a `recorder` the game is appended to its replay file.
+    """
+    game = tetris(pieces=PieceStream(seed, bag))
+    if recorder is not None:
+        recorder.record(game)
+    # closing the bot stops its search processes, if it started any
+    with Bot(**(bot_kwargs or {})) as bot:
+        grid_helper = Grid()
+        decide_s = []
+        pieces = 0
+        ticks = 0
+        fig = game.fig
+        start = time.perf_counter()
+        while not game.end and (max_pieces is None or pieces < max_pieces):
+            obs = build_observation(game, grid_helper)
+            t0 = time.perf_counter()
+            action = bot.decide(obs)
+            decide_s.append(time.perf_counter() - t0)
+
+            # a bot may also return several actions for one tick
+            ticks += 1
+            game.step(action if isinstance(action, list) else (action,),
+                      gravity=ticks % gravity == 0)
+            if game.fig is not fig:
+                pieces += 1
+                fig = game.fig
+        if recorder is not None:
+            recorder.flush()
+        if bot.tracer is not None:
+            bot.tracer.dump(seed=seed)
+
+    return {
+        "seed": seed,
+        "lines": game.score,
+        "pieces": pieces,
+        "level": game.lvl,
+        "ticks": ticks,
+        "game_over": game.end,
+        "seconds": time.perf_counter() - start,
+        "decide_s": decide_s,
+    }
+
+
+# per-process replay writer for --record, closed when the process exits
+_recorder = None
+
+
+def _play(job) -> dict:
+    global _recorder
+    *args, record_dir = job
+    if record_dir and _recorder is None:
+        _recorder = ReplayWriter(os.path.join(record_dir, "selfplay-%d.trpl" % os.getpid()))
+        Finalize(_recorder, _recorder.close, exitpriority=10)
+    return play_game(*args, recorder=_recorder if record_dir else None)
+
+
+def percentiles(values: List[float], qs=(50, 90, 99)) -> dict:
+    """Nearest-rank percentiles of `values`, plus the max, keyed "p50", ..., "max"."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    out = {}
+    for q in qs:
+        k = max(0, min(len(ordered) - 1, -(-q * len(ordered) // 100) - 1))
+        out["p%d" % q] = ordered[k]
+    out["max"] = ordered[-1]
+    return out
+
+
+def run(games: int, seed: int = 0, workers: Optional[int] = None,
+        max_pieces: Optional[int] = None, gravity: int = 6,
+        bot_kwargs: Optional[dict] = None, bag: bool = False,
+        record_dir: Optional[str] = None) -> dict:
+    """Play `games` seeded games on `workers` processes and return the aggregate report."""
+    global _recorder
+    workers = workers or multiprocessing.cpu_count()
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+    jobs = [(seed + i, max_pieces, gravity, bot_kwargs, bag, record_dir) for i in range(games)]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_play(job) for job in jobs]
+        if _recorder is not None:
+            _recorder.close()
+            _recorder = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = list(pool.imap_unordered(_play, jobs, chunksize=1))
+        finally:
+            # close + join rather than terminate, so workers close their replay files
+            pool.close()
+            pool.join()
+    wall = time.perf_counter() - start
+    results.sort(key=lambda r: r["seed"])
+
+    lines = [r["lines"] for r in results]
+    pieces = [r["pieces"] for r in results]
+    decide_ms = [s * 1000 for r in results for s in r.pop("decide_s")]
+    return {
+        "games": games,
+        "workers": workers,
+        "seed": seed,
+        "bag": bag,
+        "max_pieces": max_pieces,
+        "wall_seconds": wall,
+        "lines": {
+            "total": sum(lines),
+            "mean": sum(lines) / games,
+            "min": min(lines),
+            "max": max(lines),
+        },
+        "pieces": {
+            "total": sum(pieces),
+            "mean": sum(pieces) / games,
+        },
+        "pieces_per_second": sum(pieces) / wall if wall else 0.0,
+        "pieces_per_second_per_game": sum(
+            r["pieces"] / r["seconds"] for r in results if r["seconds"]
+        ) / games,
+        "decide_ms": dict(percentiles(decide_ms), mean=sum(decide_ms) / len(decide_ms))
+        if decide_ms else {},
+        "per_game": results,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run headless bot self-play games.")
+    parser.add_argument("--games", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--max-pieces", type=int, default=None)
+    parser.add_argument("--gravity", type=int, default=6, help="ticks per gravity step")
+    parser.add_argument("--bag", action="store_true", help="deal pieces in shuffled bags of seven")
+    parser.add_argument("--lookahead", action="store_true", help="use the two-piece search (slower)")
+    parser.add_argument("--macro", action="store_true",
+                        help="the bot answers with one placement per piece instead of single keys")
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--search-ms", type=float, default=float("inf"))
+    parser.add_argument("--record", metavar="DIR", help="write binary replays of every game to DIR")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    bot_kwargs = {
+        "lookahead": args.lookahead,
+        "top_k": args.top_k,
+        "search_ms": args.search_ms,
+        "workers": 0,
+        "macro": args.macro,
+    }
+    report = run(args.games, args.seed, args.workers, args.max_pieces, args.gravity, bot_kwargs,
+                 args.bag, args.record)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
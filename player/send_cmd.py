@@ -1,3 +1,20 @@
+"""
+Command channel for external controllers.
+
+Commands are appended to CMD_FILE (BOT_CMD_FILE overrides it) as one JSON
+line each, {"key": ..., "timestamp": ...}. The file is opened with
+O_APPEND and every batch of commands goes out in a single write(), so
+sending costs the same however long the log is, and senders in other
+processes can append at the same time without losing anything.
+
+The game reads the log with a `CommandReader`, which remembers how far it
+has read and drains every complete line that arrived since, once per
+frame. It starts at the end of the log, so commands left over from an
+earlier session are not replayed. The log is never rewritten; delete it
+while neither side is running to reclaim the space.
+
+    python -m player.send_cmd a a w space
+"""
 from __future__ import annotations
 
 import os
@@ -6,7 +23,7 @@ import json
 import time
 from pathlib import Path
 
-DEFAULT_CMD_FILE = Path(__file__).with_name("command_queue.json")
+DEFAULT_CMD_FILE = Path(__file__).with_name("command_log.jsonl")
 CMD_FILE = Path(os.getenv("BOT_CMD_FILE", str(DEFAULT_CMD_FILE)))
 
 ALIASES = {
@@ -16,31 +33,138 @@ ALIASES = {
 VALID_KEYS = {"w", "a", "s", "d", " "}
 
 
+class CommandSender:
+    """Keeps the log open for appending, so each send is one write()."""
+
+    def __init__(self, path=None) -> None:
+        self.path = Path(path) if path is not None else CMD_FILE
+        self.fd = None
+
+    def send(self, keys) -> bool:
+        """Append `keys` to the log in one write. False if a key is invalid or the write fails."""
+        lines = []
+        now = time.time()
+        for key in keys:
+            if key not in VALID_KEYS and key not in ALIASES:
+                return False
+            lines.append(json.dumps({"key": ALIASES.get(key, key), "timestamp": now}))
+        if not lines:
+            return True
+        data = ("\n".join(lines) + "\n").encode()
+        try:
+            if self.fd is None:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self.fd, data)
+        except OSError:
+            self.close()
+            return False
+        return True
+
+    def close(self) -> None:
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+_sender = None
+
+
 def send_command(key: str) -> bool:
-    """Add a command to the queue file."""
-    if key not in VALID_KEYS and key not in ALIASES:
-        return False
-    
-    actual_key = ALIASES.get(key, key)
-    try:
-        if CMD_FILE.exists():
-            with open(CMD_FILE, 'r') as f:
-                queue = json.load(f)
-                if not isinstance(queue, list):
-                    queue = []
-        else:
-            queue = []
-    except:
-        queue = []
-    
-    queue.append({
-        "key": actual_key,
-        "timestamp": time.time()
-    })
-    try:
-        with open(CMD_FILE, 'w') as f:
-            json.dump(queue, f)
-    except Exception as e:
-        return False
-    
-    return True
+    """Append a command to the log."""
+    return send_commands((key,))
+
+
+def send_commands(keys) -> bool:
+    """Append several commands to the log in one write."""
+    global _sender
+    if _sender is None:
+        _sender = CommandSender()
+    return _sender.send(keys)
+
+
+class CommandReader:
+    """
+    Game-side end of the log. drain() returns the keys of every complete
+    line appended since the last call, in order; a line still being
+    written is kept for the next call.
+    """
+
+    def __init__(self, path=None, from_start: bool = False) -> None:
+        self.path = Path(path) if path is not None else CMD_FILE
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        self.partial = b""
+        # skip whatever the log already holds, unless asked not to
+        self.skip = None
+        if not from_start:
+            try:
+                st = os.stat(self.path)
+                self.skip = (st.st_ino, st.st_size)
+            except OSError:
+                pass
+
+    def _open(self) -> bool:
+        try:
+            self.file = open(self.path, "rb")
+        except OSError:
+            return False
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.offset = 0
+        self.partial = b""
+        if self.skip is not None and self.skip[0] == self.inode:
+            self.offset = self.skip[1]
+        self.skip = None
+        return True
+
+    def drain(self) -> list:
+        if self.file is None and not self._open():
+            return []
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+        if st is None or st.st_ino != self.inode or st.st_size < self.offset:
+            # the log was deleted, replaced or truncated: start over
+            self.close()
+            if st is None or not self._open():
+                return []
+        elif st.st_size == self.offset:
+            return []
+
+        self.file.seek(self.offset)
+        data = self.file.read()
+        self.offset += len(data)
+        data = self.partial + data
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+
+        keys = []
+        for line in data[:end].splitlines():
+            try:
+                key = json.loads(line)["key"]
+            except Exception:
+                continue
+            if key in VALID_KEYS:
+                keys.append(key)
+        return keys
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def main(argv=None) -> int:
+    keys = sys.argv[1:] if argv is None else argv
+    if not send_commands(keys):
+        print("usage: python -m player.send_cmd KEY... (w, a, s, d, space)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Decision tracer.
+
+A `DecisionTracer` keeps the bot's last `capacity` decisions in a ring
+buffer allocated up front, so tracing costs a few list writes per
+decision and no I/O. dump() appends the buffered records to a JSONL file
+and empties the buffer; the bot controller does that when a game ends,
+self-play after every game, and the tracer itself at exit.
+
+What a record holds depends on the level:
+
+    1  the decision: piece, its rotation and position, the search result
+       (rotation, x, value; null when a planned key was replayed), the
+       action returned and how long decide() took in microseconds
+    2  also what the search scored: every candidate landing as (rotation,
+       x, one-piece score) and, for the two-piece search, every line it
+       searched as (rotation, x, value)
+    3  also the six El-Tetris features of every candidate
+
+Levels 2 and 3 record the search's own numbers rather than scoring the
+board again, so they are missing when decide() did not search (a planned
+key was replayed or the answer came from the transposition table).
+
+Environment:
+
+    BOT_TRACE=level         0 (default) turns tracing off
+    BOT_TRACE_EVERY=n       trace every n-th decision only (default 1)
+    BOT_TRACE_SIZE=n        ring buffer capacity (default 4096)
+    BOT_TRACE_FILE=path     where dump() appends (default bot_trace.jsonl)
+"""
+import atexit
+import json
+import os
+import threading
+
+
+class DecisionTracer:
+    def __init__(self, capacity: int = 4096, level: int = 1, every: int = 1,
+                 path: str = "bot_trace.jsonl") -> None:
+        self.ring = [None] * capacity
+        self.capacity = capacity
+        self.level = level
+        self.every = max(1, every)
+        self.path = path
+        self.head = 0
+        self.size = 0
+        self.decisions = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """A tracer configured from BOT_TRACE*, or None when tracing is off."""
+        try:
+            level = int(os.getenv("BOT_TRACE", "0"))
+        except Exception:
+            level = 0
+        if level <= 0:
+            return None
+        try:
+            every = int(os.getenv("BOT_TRACE_EVERY", "1"))
+        except Exception:
+            every = 1
+        try:
+            capacity = int(os.getenv("BOT_TRACE_SIZE", "4096"))
+        except Exception:
+            capacity = 4096
+        tracer = cls(max(1, capacity), level, every, os.getenv("BOT_TRACE_FILE", "bot_trace.jsonl"))
+        atexit.register(tracer.dump)
+        return tracer
+
+    def sample(self) -> bool:
+        """Count a decision; True if this one should be traced."""
+        self.decisions += 1
+        return self.decisions % self.every == 0
+
+    def add(self, record: dict) -> None:
+        with self.lock:
+            record["seq"] = self.decisions
+            self.ring[(self.head + self.size) % self.capacity] = record
+            if self.size < self.capacity:
+                self.size += 1
+            else:
+                # full: the oldest record is overwritten
+                self.head = (self.head + 1) % self.capacity
+                self.dropped += 1
+
+    def records(self, clear: bool = False) -> list:
+        """The buffered records, oldest first; with `clear` the buffer is emptied too."""
+        with self.lock:
+            ring, head, capacity = self.ring, self.head, self.capacity
+            records = [ring[(head + i) % capacity] for i in range(self.size)]
+            if clear:
+                for i in range(self.size):
+                    ring[(head + i) % capacity] = None
+                self.head = self.size = 0
+            return records
+
+    def dump(self, path=None, **fields) -> int:
+        """
+        Append the buffered records to `path` (the tracer's file by default)
+        as JSON lines, each extended with `fields`, and empty the buffer.
+        Returns the number of records written.
+        """
+        records = self.records(clear=True)
+        if not records:
+            return 0
+        lines = []
+        for record in records:
+            if fields:
+                record = dict(record, **fields)
+            lines.append(json.dumps(record))
+        data = ("\n".join(lines) + "\n").encode()
+        # one O_APPEND write, so processes sharing the file never interleave lines
+        fd = os.open(path or self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        return len(records)
@@ -0,0 +1,111 @@
+"""
+Zobrist hashing and a bounded transposition table for the bot.
+
+Self-play and lookahead keep reaching the same boards (the same surface after
+different move orders, the same board after a line clear). `Zobrist` gives
+every board a 64-bit hash that can be updated cell by cell, and
+`TranspositionTable` memoizes evaluations and search results under those
+hashes, evicting the least recently used entries once its estimated size
+goes over a memory cap.
+"""
+import random
+import sys
+from collections import OrderedDict
+
+# Rough per-entry cost of the OrderedDict itself (hash slot plus the linked
+# list node), on top of the key and value objects.
+_ENTRY_OVERHEAD = 100
+
+
+class Zobrist:
+    """One random 64-bit key per cell; a board hashes to the XOR of its filled cells."""
+
+    def __init__(self, n_rows: int, n_cols: int, seed: int = 0x5EED) -> None:
+        rng = random.Random(seed)
+        self.keys = [[rng.getrandbits(64) for _ in range(n_cols)] for _ in range(n_rows)]
+
+    def hash_grid(self, grid) -> int:
+        h = 0
+        for row, keys in zip(grid, self.keys):
+            for cell, key in zip(row, keys):
+                if cell != 0:
+                    h ^= key
+        return h
+
+    def toggle(self, h: int, cells) -> int:
+        """Hash of the board `h` with `cells` flipped (filled <-> empty)."""
+        keys = self.keys
+        for r, c in cells:
+            h ^= keys[r][c]
+        return h
+
+
+_zobrist_tables = {}
+
+
+def zobrist_for(grid) -> Zobrist:
+    """Shared Zobrist keys for boards of this grid's size."""
+    size = (len(grid), len(grid[0]))
+    table = _zobrist_tables.get(size)
+    if table is None:
+        table = _zobrist_tables[size] = Zobrist(*size)
+    return table
+
+
+class TranspositionTable:
+    """
+    LRU memo capped at roughly `max_bytes`, with hit/miss/eviction counters.
+    Sizes are estimated with sys.getsizeof, so the cap is approximate.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(key, value) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        entries = self.entries
+        if key in entries:
+            self.bytes -= self._size(key, entries.pop(key))
+        entries[key] = value
+        self.bytes += self._size(key, value)
+        while self.bytes > self.max_bytes and entries:
+            old_key, old_value = entries.popitem(last=False)
+            self.bytes -= self._size(old_key, old_value)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,209 @@
+"""
+Cross-entropy tuner for the bot's WEIGHTS.
+
+The canonical El-Tetris weights were fitted to a different rule set (wall
+kicks, four rotation states for every piece, another line-clear score), so
+this tunes them against the engine in this repo:
+
+    python -m player.tune --generations 40 --population 32 --games 8 \
+        --checkpoint tune_state.json --out weights.json
+
+Every generation samples `population` weight vectors from a Gaussian and
+plays each on the same `games` seeded headless games, so every candidate
+sees the same pieces in the same order; all candidate/game pairs go to
+the worker pool as one batch. The Gaussian is then refitted to the elite
+fraction, with decaying extra noise so it does not collapse too early.
+Fitness is the mean number of lines cleared, with the mean number of
+pieces placed breaking ties. The state is checkpointed after every
+generation and --resume picks up from the checkpoint. The best weights
+seen so far are written to --out, which `Bot(weights=...)` or
+BOT_WEIGHTS=weights.json loads.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from typing import Optional
+
+from .bot import WEIGHTS
+from .selfplay import play_game
+
+NAMES = sorted(WEIGHTS)
+
+
+def _write_json(path: str, data) -> None:
+    # write-then-rename so an interrupted run never leaves a torn file behind
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def _evaluate(job):
+    """Worker task: (candidate index, lines, pieces) for one weight vector on one seed."""
+    index, weights, seed, max_pieces, lookahead, bag = job
+    result = play_game(seed, max_pieces, bot_kwargs={
+        "weights": weights,
+        "lookahead": lookahead,
+        "search_ms": float("inf"),
+        "workers": 0,
+    }, bag=bag)
+    return index, result["lines"], result["pieces"]
+
+
+class CrossEntropyTuner:
+    def __init__(self, population: int = 32, elite: float = 0.25, games: int = 8,
+                 max_pieces: Optional[int] = 500, seed: int = 0, sigma: float = 5.0,
+                 noise: float = 4.0, lookahead: bool = False, bag: bool = False) -> None:
+        self.population = population
+        self.n_elite = max(2, int(round(population * elite)))
+        self.games = games
+        self.max_pieces = max_pieces
+        self.seed = seed
+        self.noise = noise
+        self.lookahead = lookahead
+        self.bag = bag
+
+        self.generation = 0
+        self.mean = [WEIGHTS[name] for name in NAMES]
+        self.std = [sigma] * len(NAMES)
+        self.best = None
+        self.history = []
+
+    def state(self) -> dict:
+        return {
+            "config": {
+                "population": self.population,
+                "n_elite": self.n_elite,
+                "games": self.games,
+                "max_pieces": self.max_pieces,
+                "seed": self.seed,
+                "noise": self.noise,
+                "lookahead": self.lookahead,
+                "bag": self.bag,
+            },
+            "names": NAMES,
+            "generation": self.generation,
+            "mean": self.mean,
+            "std": self.std,
+            "best": self.best,
+            "history": self.history,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CrossEntropyTuner":
+        config = dict(state["config"])
+        n_elite = config.pop("n_elite")
+        tuner = cls(**config)
+        tuner.n_elite = n_elite
+        tuner.generation = state["generation"]
+        tuner.mean = state["mean"]
+        tuner.std = state["std"]
+        tuner.best = state["best"]
+        tuner.history = state["history"]
+        return tuner
+
+    def sample(self):
+        # one RNG per generation, so a resumed run samples exactly what it would have
+        rng = random.Random(self.seed * 1_000_003 + self.generation)
+        return [
+            {name: rng.gauss(m, s) for name, m, s in zip(NAMES, self.mean, self.std)}
+            for _ in range(self.population)
+        ]
+
+    def step(self, pool) -> dict:
+        """Run one generation on `pool` (None runs in-process) and return its summary."""
+        start = time.perf_counter()
+        candidates = self.sample()
+        # every candidate plays the same seeds, so they are compared on equal games
+        seeds = [self.seed + self.generation * self.games + g for g in range(self.games)]
+        jobs = [(i, w, s, self.max_pieces, self.lookahead, self.bag)
+                for i, w in enumerate(candidates) for s in seeds]
+        results = pool.imap_unordered(_evaluate, jobs, chunksize=1) if pool else map(_evaluate, jobs)
+
+        lines = [0] * self.population
+        survived = [0] * self.population
+        for index, n_lines, n_pieces in results:
+            lines[index] += n_lines
+            survived[index] += n_pieces
+        pieces = sum(survived)
+        fitness = [total / self.games for total in lines]
+
+        # pieces survived break ties, which is all the signal there is while
+        # no candidate clears lines yet
+        ranked = sorted(range(self.population), key=lambda i: (-lines[i], -survived[i]))
+        elite = [candidates[i] for i in ranked[:self.n_elite]]
+        extra = self.noise / (self.generation + 1)
+        for k, name in enumerate(NAMES):
+            values = [w[name] for w in elite]
+            mean = sum(values) / len(values)
+            var = sum((v - mean) ** 2 for v in values) / len(values)
+            self.mean[k] = mean
+            self.std[k] = math.sqrt(var + extra)
+
+        top = ranked[0]
+        key = [fitness[top], survived[top] / self.games]
+        if self.best is None or key > [self.best["fitness"], self.best["pieces"]]:
+            self.best = {"fitness": key[0], "pieces": key[1], "generation": self.generation,
+                         "weights": candidates[top]}
+        seconds = time.perf_counter() - start
+        summary = {
+            "generation": self.generation,
+            "best_fitness": fitness[top],
+            "best_pieces": survived[top] / self.games,
+            "mean_fitness": sum(fitness) / self.population,
+            "elite_fitness": sum(fitness[i] for i in ranked[:self.n_elite]) / self.n_elite,
+            "pieces": pieces,
+            "pieces_per_second": pieces / seconds if seconds else 0.0,
+            "seconds": seconds,
+        }
+        self.history.append(summary)
+        self.generation += 1
+        return summary
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Tune the bot's WEIGHTS with the cross-entropy method.")
+    parser.add_argument("--generations", type=int, default=40, help="total generations to reach")
+    parser.add_argument("--population", type=int, default=32)
+    parser.add_argument("--elite", type=float, default=0.25, help="fraction of the population kept")
+    parser.add_argument("--games", type=int, default=8, help="games per candidate")
+    parser.add_argument("--max-pieces", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sigma", type=float, default=5.0, help="initial standard deviation")
+    parser.add_argument("--noise", type=float, default=4.0, help="extra variance, divided by generation + 1")
+    parser.add_argument("--lookahead", action="store_true", help="tune the two-piece search (slower)")
+    parser.add_argument("--bag", action="store_true", help="deal pieces in shuffled bags of seven")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--checkpoint", default="tune_state.json")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    parser.add_argument("--out", default="weights.json", help="best weights, loadable by Bot")
+    args = parser.parse_args(argv)
+
+    if args.resume and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as f:
+            tuner = CrossEntropyTuner.from_state(json.load(f))
+    else:
+        tuner = CrossEntropyTuner(args.population, args.elite, args.games, args.max_pieces,
+                                  args.seed, args.sigma, args.noise, args.lookahead, args.bag)
+
+    workers = args.workers or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        while tuner.generation < args.generations:
+            summary = tuner.step(pool)
+            _write_json(args.checkpoint, tuner.state())
+            _write_json(args.out, tuner.best["weights"])
+            print(json.dumps(summary), flush=True)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == "__main__":
+    main()
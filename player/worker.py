@@ -0,0 +1,117 @@
+"""
+Background decision worker.
+
+`DecisionWorker` runs `bot.decide` on a daemon thread so the frame loop
+never waits for the bot. The loop submits the newest observation together
+with the game's `decision_state()`; a submission the worker has not
+started yet is simply replaced by the next one. Decisions come back
+through a queue, and poll() drops the stale ones: those made before the
+board changed, a new piece spawned or the piece was turned or shifted.
+A piece that only fell (gravity or a soft drop) keeps its decision, and
+such decisions are counted in `gravity`.
+"""
+import queue
+import threading
+import time
+from typing import Optional
+
+
+def decision_state(game):
+    """
+    (key, y) of `game` for the worker: a decision stays valid while the key
+    (board_generation, the falling piece, its rotation and x) is unchanged,
+    whatever row y the piece has fallen to since.
+    """
+    fig = getattr(game, "fig", None)
+    if fig is None:
+        return (getattr(game, "board_generation", None), None, None, None), None
+    # identity of the piece object, so a new piece of the same type differs
+    return (game.board_generation, id(fig), fig.rotation, fig.x), fig.y
+
+
+class DecisionWorker:
+    def __init__(self, bot, deadline_ms: Optional[float] = None) -> None:
+        self.bot = bot
+        # decisions slower than this are counted as late
+        self.deadline = deadline_ms / 1000 if deadline_ms else None
+        self.results = queue.SimpleQueue()
+        self.pending = None
+        self.wake = threading.Condition()
+        self.closed = False
+
+        self.submitted = 0
+        self.replaced = 0
+        self.decided = 0
+        self.stale = 0
+        self.gravity = 0
+        self.late = 0
+        self.errors = 0
+
+        self.thread = threading.Thread(target=self._run, name="bot-decide", daemon=True)
+        self.thread.start()
+
+    def submit(self, obs: dict, state) -> None:
+        """Queue `obs`, seen at decision_state() `state`, replacing any observation still waiting."""
+        with self.wake:
+            if self.pending is not None:
+                self.replaced += 1
+            self.pending = (obs, state, time.perf_counter())
+            self.submitted += 1
+            self.wake.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self.wake:
+                while self.pending is None and not self.closed:
+                    self.wake.wait()
+                if self.closed:
+                    return
+                obs, state, submitted = self.pending
+                self.pending = None
+            try:
+                action = self.bot.decide(obs)
+            except Exception:
+                self.errors += 1
+                action = None
+            self.results.put((state, action, time.perf_counter() - submitted))
+
+    def poll(self, state):
+        """
+        (True, action) for the newest decision still valid at decision_state()
+        `state`, or (False, None) if none has come back. Decisions made for
+        another key are discarded and counted in `stale`; those for the same
+        key at another row are kept and counted in `gravity`.
+        """
+        key, y = state
+        found = False
+        action = None
+        while True:
+            try:
+                (decided_key, decided_y), decided, elapsed = self.results.get_nowait()
+            except queue.Empty:
+                return found, action
+            self.decided += 1
+            if self.deadline is not None and elapsed > self.deadline:
+                self.late += 1
+            if decided_key != key:
+                self.stale += 1
+                continue
+            if decided_y != y:
+                self.gravity += 1
+            found, action = True, decided
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "replaced": self.replaced,
+            "decided": self.decided,
+            "stale": self.stale,
+            "gravity": self.gravity,
+            "late": self.late,
+            "errors": self.errors,
+        }
+
+    def close(self) -> None:
+        with self.wake:
+            self.closed = True
+            self.wake.notify()
@@ -0,0 +1,78 @@
+import random
+
+from tetris.bitboard import BitboardTetris
+from tetris.engine import PieceStream, tetris
+from tetris.server import board_rows
+
+ACTIONS = ["left", "right", "rotate", "fast_drop", "freefall", "move", None]
+
+
+def prefilled(rng, rows, cols):
+    """A board whose lower rows each miss one cell, so random play clears lines."""
+    grid = [[0] * cols for _ in range(rows)]
+    for r in range(rows - rng.randrange(3, 10), rows):
+        gap = rng.randrange(cols)
+        grid[r] = [0 if c == gap else 1 + (r + c) % 4 for c in range(cols)]
+    return grid
+
+
+def same_state(a, b):
+    assert board_rows(a) == board_rows(b)
+    assert a.grid == b.grid
+    assert (a.score, a.lvl, a.end) == (b.score, b.lvl, b.end)
+    assert (a.fig.type, a.fig.rotation, a.fig.x, a.fig.y) == (b.fig.type, b.fig.rotation, b.fig.x, b.fig.y)
+    assert a.next.type == b.next.type
+
+
+def test_random_play_matches_list_engine():
+    rng = random.Random(3)
+    lines = ends = 0
+    for seed in range(40):
+        bag = seed % 2 == 1
+        a = tetris(pieces=PieceStream(seed, bag))
+        b = BitboardTetris(pieces=PieceStream(seed, bag))
+        a.grid = prefilled(rng, a.rows, a.cols)
+        a.touch(board=True)
+        b.grid = a.grid
+        for n in range(600):
+            if a.end:
+                break
+            action = rng.choice(ACTIONS)
+            if action is None:
+                action = ("place", rng.randrange(4), rng.randrange(-1, a.cols))
+            a.step((action,), gravity=n % 3 == 0)
+            b.step((action,), gravity=n % 3 == 0)
+            same_state(a, b)
+        lines += a.score
+        ends += a.end
+    assert lines and ends
+
+
+def test_stack_to_the_top_matches_list_engine():
+    # pieces stuck at spawn freeze at y = -1; both backends must agree there too
+    for seed in range(10):
+        a = tetris(pieces=PieceStream(seed))
+        b = BitboardTetris(pieces=PieceStream(seed))
+        while not a.end:
+            a.freefall()
+            b.freefall()
+            same_state(a, b)
+        assert b.end
+
+
+def test_remove_row_limited_to_rows():
+    for cls in (tetris, BitboardTetris):
+        game = cls(pieces=PieceStream(1))
+        grid = [[0] * game.cols for _ in range(game.rows)]
+        grid[-1] = [1] * game.cols
+        grid[-3] = [2] * game.cols
+        grid[-2][4] = 3
+        game.grid = grid
+        game.touch(board=True)
+        game.remove_row(rows=[game.rows - 3])
+        assert game.score == 1
+        assert game.grid[-1] == [1] * game.cols
+        assert game.grid[-2][4] == 3
+        game.remove_row()
+        assert game.score == 2
+        assert game.grid[-1][4] == 3 and sum(map(any, game.grid)) == 1
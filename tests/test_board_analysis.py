@@ -0,0 +1,67 @@
+import random
+
+from player.board_analysis import BoardAnalysis
+from player.bot import (best_placement, clear_full_lines, column_transitions, enumerate_landings,
+                        eltetris_score, evaluate_eltetris, holes, landing_height_avg,
+                        piece_rotations, place_piece, row_transitions, rows_eliminated_feature,
+                        second_ply_bound, well_sums)
+from tetris.engine import COLS, ROWS
+
+
+def reference_features(grid, cells):
+    new_grid, cleared = clear_full_lines(place_piece(grid, cells, val=1))
+    return (landing_height_avg(cells), rows_eliminated_feature(cells, cleared),
+            row_transitions(new_grid), column_transitions(new_grid),
+            holes(new_grid), well_sums(new_grid))
+
+
+def test_two_line_clear_with_vertical_i():
+    grid = [[0] * COLS for _ in range(ROWS)]
+    for r in (ROWS - 2, ROWS - 1):
+        grid[r] = [0] + [1] * (COLS - 1)
+    grid[ROWS - 3][5] = 1
+    cells = [(ROWS - 4 + i, 0) for i in range(4)]
+
+    features = BoardAnalysis(grid).features_after(cells)
+    assert features == reference_features(grid, cells)
+    new_grid, cleared = clear_full_lines(place_piece(grid, cells, val=1))
+    assert eltetris_score(*features) == evaluate_eltetris(new_grid, cells, cleared)
+
+
+def test_features_after_matches_bot_on_random_clears():
+    rng = random.Random(5)
+    clears = multi = 0
+    for _ in range(300):
+        grid = [[0] * COLS for _ in range(ROWS)]
+        for r in range(ROWS - 1, ROWS - 1 - rng.randrange(2, 10), -1):
+            gaps = rng.sample(range(COLS), rng.choice((1, 1, 2)))
+            grid[r] = [0 if c in gaps else 1 for c in range(COLS)]
+        analysis = BoardAnalysis(grid)
+        piece = {"type": rng.choice("IZSLJTO")}
+        for _, _, _, cells in enumerate_landings(grid, piece_rotations(piece)):
+            expected = reference_features(grid, cells)
+            assert analysis.features_after(cells) == expected, cells
+            cleared = clear_full_lines(place_piece(grid, cells, val=1))[1]
+            clears += bool(cleared)
+            multi += len(cleared) > 1
+            # apply()/undo() leave the board as it was
+            token = analysis.apply(cells)
+            assert analysis.features() == expected[2:]
+            analysis.undo(token)
+    assert clears and multi
+
+
+def test_second_ply_bound_is_an_upper_bound():
+    rng = random.Random(8)
+    for n in range(400):
+        grid = [[0] * COLS for _ in range(ROWS)]
+        for r in range(ROWS - 1, ROWS - 1 - rng.randrange(1, 12), -1):
+            gaps = rng.sample(range(COLS), rng.randrange(0, 5))
+            grid[r] = [0 if c in gaps else 1 for c in range(COLS)]
+        if n % 4 == 0:
+            # a full row left on the board is cleared by the next placement
+            grid[rng.randrange(ROWS - 12, ROWS)] = [1] * COLS
+        bound = second_ply_bound(BoardAnalysis(grid))
+        for kind in "IZSLJTO":
+            best = best_placement(grid, {"type": kind})
+            assert best is None or best[2] <= bound + 1e-9, (n, kind)
@@ -0,0 +1,119 @@
+import random
+
+from tetris.engine import PieceStream, shape, tetris
+
+ACTIONS = ["left", "right", "rotate", "fast_drop", "freefall", "move", None]
+
+
+class ScanningTetris(tetris):
+    """The engine with the original row-by-row line clear."""
+
+    def remove_row(self, rows=None):
+        rerun = False
+        for i in range(self.rows - 1, 0, -1):
+            if all(self.grid[i]):
+                del self.grid[i]
+                self.grid.insert(0, [0] * self.cols)
+                self.touch(board=True)
+                self.score += 1
+                if self.score % 5 == 0:
+                    self.lvl += 1
+                rerun = True
+        if rerun:
+            self.remove_row()
+
+
+def prefilled(rng, rows, cols):
+    """Lower rows missing one cell each, sometimes with a full row 0."""
+    grid = [[0] * cols for _ in range(rows)]
+    for r in range(rows - rng.randrange(3, 12), rows):
+        gap = rng.randrange(cols)
+        grid[r] = [0 if c == gap else 1 + (r + c) % 4 for c in range(cols)]
+    if rng.random() < 0.3:
+        grid[0] = [1] * cols
+    return grid
+
+
+def reference_stream(seed, bag, chunk, n):
+    """What PieceStream deals, drawn with random.Random's own methods."""
+    rng = random.Random(seed)
+    kinds = len(shape.shapes)
+    pieces = []
+    while len(pieces) < n:
+        if bag:
+            types = []
+            while len(types) < chunk:
+                bag_types = list(range(kinds))
+                rng.shuffle(bag_types)
+                types.extend(bag_types)
+        else:
+            types = [rng.randrange(kinds) for _ in range(chunk)]
+        pieces.extend((shape.shapes[t], rng.randint(1, 4)) for t in types)
+    return pieces[:n]
+
+
+def test_piece_stream_deals_like_random():
+    for seed in (0, 1, 7, 2 ** 64 - 1):
+        for bag in (False, True):
+            for chunk in (4096, 100, 7, 1):
+                stream = PieceStream(seed, bag, chunk)
+                assert [stream[i] for i in range(5000)] == reference_stream(seed, bag, chunk, 5000)
+
+
+def test_line_clears_match_the_row_scan():
+    rng = random.Random(11)
+    lines = ends = 0
+    for seed in range(60):
+        a = tetris(pieces=PieceStream(seed))
+        b = ScanningTetris(pieces=PieceStream(seed))
+        grid = prefilled(rng, a.rows, a.cols)
+        a.grid = [row[:] for row in grid]
+        b.grid = [row[:] for row in grid]
+        a.touch(board=True)
+        b.touch(board=True)
+        for n in range(800):
+            if a.end:
+                break
+            if n % 97 == 96:
+                # an edit from outside the engine, picked up through touch()
+                r, c = rng.randrange(a.rows), rng.randrange(a.cols)
+                a.grid[r][c] = b.grid[r][c] = rng.randrange(2)
+                a.touch(board=True)
+                b.touch(board=True)
+            action = rng.choice(ACTIONS)
+            if action is None:
+                action = ("place", rng.randrange(4), rng.randrange(-1, a.cols))
+            a.step((action,), gravity=n % 3 == 0)
+            b.step((action,), gravity=n % 3 == 0)
+            assert a.grid == b.grid
+            assert (a.score, a.lvl, a.end) == (b.score, b.lvl, b.end)
+            assert a.row_fill() == [sum(1 for cell in row if cell > 0) for row in a.grid]
+        lines += a.score
+        ends += a.end
+    assert lines and ends
+
+
+def test_full_top_row_clears_with_the_next_line():
+    for cls in (tetris, ScanningTetris):
+        game = cls(pieces=PieceStream(2))
+        game.grid[0] = [1] * game.cols
+        game.touch(board=True)
+        game.remove_row()
+        assert game.score == 0 and all(game.grid[0])
+        game.grid[-1] = [2] * game.cols
+        game.grid[-2][3] = 3
+        game.touch(board=True)
+        game.row_fill()
+        game.remove_row(rows=[game.rows - 1])
+        assert game.score == 2
+        assert not any(game.grid[0]) and game.grid[-1][3] == 3
+
+
+def test_apply_action_rejects_malformed_actions():
+    game = tetris(pieces=PieceStream(3))
+    fig = game.fig
+    position = (fig.rotation, fig.x, fig.y)
+    for action in (["place", 0, 3], {"place": 0}, 1, None, ("place", 0), "jump"):
+        assert game.apply_action(action) is False
+    assert game.fig is fig and (fig.rotation, fig.x, fig.y) == position
+    assert game.apply_action("a") is True
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from tetris.bitboard import BitboardTetris
+from tetris.engine import PieceStream, tetris
+from tetris.replay import ACTIONS, ReplayFile, Replayer, ReplayWriter
+
+KEYS = ACTIONS + ("left", "right") * 4
+
+
+def occupancy(grid):
+    return [[1 if cell else 0 for cell in row] for row in grid]
+
+
+def record_games(path, count=3):
+    """Record `count` games, keys and placements alternating; returns the
+    per-game snapshots after every piece and the bytes before close()."""
+    rng = random.Random(4)
+    snapshots = []
+    with ReplayWriter(path, keyframe_every=8) as writer:
+        for gi in range(count):
+            game = tetris(pieces=PieceStream(100 + gi, gi % 2 == 1))
+            writer.record(game)
+            snap = {}
+            fig = game.fig
+            pieces = 0
+            while not game.end and pieces < 80:
+                if gi % 2 == 0:
+                    # mostly sideways, so the stack stays low for a while
+                    getattr(game, rng.choice(KEYS))()
+                else:
+                    try:
+                        writer.place(rng.randrange(len(game.fig.shape)), rng.randrange(-1, game.cols))
+                    except ValueError:
+                        continue
+                if game.fig is not fig:
+                    pieces += 1
+                    fig = game.fig
+                    snap[pieces] = (occupancy(game.grid), game.score, game.lvl, fig.type, game.next.type)
+            snapshots.append(snap)
+        writer.flush()
+        with open(path, "rb") as f:
+            unclosed = f.read()
+    return snapshots, unclosed
+
+
+def test_replay_round_trip(tmp_path):
+    path = str(tmp_path / "games.trpl")
+    snapshots, unclosed = record_games(path)
+    # every game gets past its first keyframe
+    assert min(max(snap) for snap in snapshots) > 8
+    (tmp_path / "unclosed.trpl").write_bytes(unclosed)
+    for replay in (ReplayFile(path), ReplayFile(str(tmp_path / "unclosed.trpl"))):
+        assert len(replay.games) == len(snapshots)
+        for gi, snap in enumerate(snapshots):
+            last = max(snap)
+            for cls in (tetris, BitboardTetris):
+                replayer = Replayer(replay, gi, cls)
+                game = replayer.run()
+                assert replayer.pieces == last
+                assert occupancy(game.grid) == snap[last][0] and game.score == snap[last][1]
+                for piece in (last, 3, 17, 16, 9, 8, 1):
+                    if piece not in snap:
+                        continue
+                    game = replayer.seek(piece)
+                    grid, score, lvl, fig, nxt = snap[piece]
+                    assert occupancy(game.grid) == grid
+                    assert (game.score, game.lvl, game.fig.type, game.next.type) == (score, lvl, fig, nxt)
+        replay.close()
+
+
+def test_place_rejects_without_writing(tmp_path):
+    path = str(tmp_path / "place.trpl")
+    with ReplayWriter(path) as writer:
+        game = tetris(pieces=PieceStream(1))
+        writer.record(game)
+        size = writer.file.tell()
+        for rotation, x in ((4, 0), (0, 128), (0, 40)):
+            with pytest.raises(ValueError):
+                writer.place(rotation, x)
+        assert writer.file.tell() == size
@@ -0,0 +1,90 @@
+import asyncio
+import random
+import threading
+
+import pytest
+
+from tetris.engine import PieceStream, tetris
+from tetris.server import GameClient, GameServer, board_rows, encode_action
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / "server.sock")
+    ready = threading.Event()
+    state = {}
+
+    async def serve():
+        state["loop"] = asyncio.get_running_loop()
+        state["stop"] = stop = asyncio.Event()
+        server = await GameServer().start(unix=path)
+        ready.set()
+        await stop.wait()
+        server.close()
+        await server.wait_closed()
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    with GameClient(unix=path) as c:
+        yield c
+    state["loop"].call_soon_threadsafe(state["stop"].set)
+    thread.join(5)
+
+
+def test_steps_match_local_engines(client):
+    count = 32
+    client.new(count, seed=5, auto_reset=True)
+    # the server draws piece seeds from random.Random(seed) in creation order
+    rng = random.Random(5)
+    local = [tetris(pieces=PieceStream(rng.getrandbits(64))) for _ in range(count)]
+    actions = ["a", "d", "w", "s", " ", None, ("place", 1, 3), ("place", 0, 20)]
+    pick = random.Random(1)
+    resets = 0
+    for n in range(200):
+        step = {i: pick.choice(actions) for i in range(count)}
+        for obs in client.step(step, gravity=n % 3 == 0):
+            game = local[obs["game"]]
+            action = step[obs["game"]]
+            game.step(() if action is None else (action,), gravity=n % 3 == 0)
+            if game.end:
+                assert obs["end"] and obs["reset"] and obs["score"] == game.score
+                game = local[obs["game"]] = tetris(pieces=PieceStream(rng.getrandbits(64)))
+                resets += 1
+            else:
+                assert not obs["end"] and obs["score"] == game.score
+            assert obs["board"] == board_rows(game)
+            fig = game.fig
+            assert obs["piece"] == (fig.type, fig.rotation, fig.x, fig.y)
+            assert obs["next"] == game.next.type
+    assert resets
+
+
+def test_every_reply_reports_a_finished_game(client):
+    client.new(2, seed=1)
+    for _ in range(200):
+        (obs,) = client.step({0: " "})
+        if obs["end"]:
+            break
+    assert obs["end"]
+    observed = {o["game"]: o["end"] for o in client.observe()}
+    assert observed == {0: True, 1: False}
+    assert client.observe([0])[0]["end"]
+    assert not client.reset([0])[0]["end"]
+
+
+def test_rejected_board_size_keeps_the_client_size(client):
+    first = client.new(2, seed=1)
+    with pytest.raises(ValueError):
+        client.new(1, rows=20, cols=10)
+    observed = client.observe()
+    assert [o["game"] for o in observed] == [0, 1]
+    assert [o["board"] for o in observed] == [o["board"] for o in first]
+
+
+def test_encode_action_checks_place_ranges():
+    assert encode_action(("place", 3, -128)) == (0x13, -128)
+    assert encode_action(None) == (0xFF, 0)
+    for action in (("place", 4, 0), ("place", -1, 0), ("place", 0, 128), ("place", 0, -129), "x"):
+        with pytest.raises(ValueError):
+            encode_action(action)
@@ -0,0 +1,42 @@
+from player.bot import Bot, enumerate_landings, piece_rotations, score_landings, without_piece
+from player.observation import build_observation
+from player.trace import DecisionTracer
+from tetris.engine import PieceStream, tetris
+
+
+def play(tracer, **bot_kwargs):
+    game = tetris(pieces=PieceStream(2))
+    grids = []
+    with Bot(tracer=tracer, search_ms=float("inf"), workers=0, macro=True, **bot_kwargs) as bot:
+        for _ in range(20):
+            obs = build_observation(game)
+            grids.append((without_piece(obs["grid"], obs["current_piece"]["cells"]),
+                          obs["current_piece"]))
+            game.step((bot.decide(obs),))
+            if game.end:
+                break
+    return grids
+
+
+def test_level_3_records_what_the_search_scored():
+    tracer = DecisionTracer(level=3)
+    grids = play(tracer, lookahead=False)
+    records = tracer.records()
+    assert len(records) == len(grids)
+    for record, (grid, piece) in zip(records, grids):
+        features = []
+        landings = enumerate_landings(grid, piece_rotations(piece))
+        scores = score_landings(grid, landings, features)
+        assert record["candidates"] == [[r, x, s] for (r, _, x, _), s in zip(landings, scores)]
+        assert record["features"] == features
+        assert max(scores) == record["search"][2]
+        assert "lines" not in record
+
+
+def test_lookahead_records_its_lines():
+    tracer = DecisionTracer(level=2)
+    play(tracer, lookahead=True, top_k=4)
+    for record in tracer.records():
+        assert "features" not in record
+        assert 1 <= len(record["lines"]) <= 4
+        assert max(value for _, _, value in record["lines"]) == record["search"][2]
@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+import pytest
+
+from tetris.engine import PieceStream, shape, tetris
+from tetris.replay import ACTIONS
+from tetris.server import NOOP, PLACE
+from tetris.vector import VectorEnv
+
+
+def test_steps_match_single_games():
+    count = 16
+    env = VectorEnv(count, seed=3, cls=tetris)
+    # VectorEnv draws piece seeds from random.Random(seed) in game order
+    rng = random.Random(3)
+    games = [tetris(pieces=PieceStream(rng.getrandbits(64))) for _ in range(count)]
+    pick = np.random.default_rng(0)
+    board0 = env.board
+    ends = 0
+    for n in range(600):
+        codes = pick.choice([0, 1, 2, 3, 4, 5, NOOP, PLACE, PLACE | 1], size=count).astype(np.uint8)
+        xs = pick.integers(-1, 16, size=count)
+        board, piece, reward, done = env.step(codes, xs, gravity=n % 2 == 0)
+        assert board is board0
+        for i, game in enumerate(games):
+            code = int(codes[i])
+            action = (None if code == NOOP else ACTIONS[code] if code < len(ACTIONS)
+                      else ("place", code & 3, int(xs[i])))
+            before = game.score
+            game.step(() if action is None else (action,), n % 2 == 0)
+            assert reward[i] == game.score - before
+            if game.end:
+                assert done[i] and env.final_score[i] == game.score
+                game = games[i] = tetris(pieces=PieceStream(rng.getrandbits(64)))
+                ends += 1
+            else:
+                assert not done[i]
+            expected = np.array([[1 if v else 0 for v in row] for row in game.grid], np.uint8)
+            assert (board[i] == expected).all()
+            fig = game.fig
+            assert tuple(piece[i]) == (shape.shapes.index(fig.type), fig.rotation, fig.x, fig.y)
+            assert env.next_piece[i] == shape.shapes.index(game.next.type)
+            assert env.score[i] == game.score
+    assert ends
+
+
+def test_bad_actions_leave_the_games_alone():
+    env = VectorEnv(4, seed=1)
+    piece = env.piece.copy()
+    with pytest.raises(ValueError, match="unknown action code 7"):
+        env.step(np.array([0, 1, 7, 2]))
+    with pytest.raises(ValueError, match="need x"):
+        env.step(np.array([0, PLACE, 0, 0]))
+    with pytest.raises(ValueError, match="expected 4 actions"):
+        env.step(np.array([0, 0]))
+    assert (env.piece == piece).all()
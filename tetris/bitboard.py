@@ -0,0 +1,140 @@
+"""
+Bitboard backend for the headless engine.
+
+Each board row is stored as an int with bit `c` set when column `c` is
+filled, and pieces are checked with the row masks from `engine.GEOMETRY`,
+shifted to every column once per board width. That turns collision into a
+table lookup and a few ANDs, a full line into `row == full` and a line
+clear into a few list deletions. Colours live in a separate sparse layer
+(one dict per row) so `grid` can still be rebuilt for rendering and
+`Grid.get_grid`.
+"""
+from tetris import engine
+
+# _PLACEMENTS[cols][type][rotation][x]: the rotation's row masks already
+# shifted to column x, as ((dy, mask), ...) sorted by dy, for every x at
+# which the piece fits between the walls
+_PLACEMENTS = {}
+
+
+def placements(cols: int):
+    table = _PLACEMENTS.get(cols)
+    if table is None:
+        table = _PLACEMENTS[cols] = {
+            name: tuple(
+                {x: tuple((dy, mask << x if x >= 0 else mask >> -x) for dy, mask in geo.row_masks)
+                 for x in range(-geo.min_dx, cols - geo.max_dx)}
+                for geo in rotations)
+            for name, rotations in engine.GEOMETRY.items()
+        }
+    return table
+
+
+class BitboardTetris(engine.tetris):
+    def __init__(self, rows=engine.ROWS, cols=engine.COLS, seed=None, pieces=None):
+        self.full = (1 << cols) - 1
+        self.placements = placements(cols)
+        super().__init__(rows, cols, seed, pieces)
+
+    @property
+    def grid(self):
+        cols = range(self.cols)
+        return [[row.get(c, 0) for c in cols] for row in self.colors]
+
+    @grid.setter
+    def grid(self, grid):
+        self.bits = []
+        self.colors = []
+        for row in grid:
+            colors = {c: v for c, v in enumerate(row) if v > 0}
+            bits = 0
+            for c in colors:
+                bits |= 1 << c
+            self.bits.append(bits)
+            self.colors.append(colors)
+        self.touch(board=True)
+
+    def collision(self) -> bool:
+        fig = self.fig
+        if not fig:
+            return False
+        masks = self.placements[fig.type][fig.rotation].get(fig.x)
+        if masks is None:
+            return True
+        y = fig.y
+        if y + masks[0][0] < 0 or y + masks[-1][0] >= self.rows:
+            return True
+        bits = self.bits
+        for dy, mask in masks:
+            if bits[y + dy] & mask:
+                return True
+        return False
+
+    def freefall(self):
+        # engine.tetris.freefall() with collision() inlined: the piece's
+        # shifted masks are looked up once for the whole drop
+        fig = self.fig
+        masks = self.placements[fig.type][fig.rotation].get(fig.x)
+        y = fig.y
+        if masks is not None and y + masks[0][0] >= 0:
+            bits = self.bits
+            bottom = self.rows - masks[-1][0]
+            while y < bottom:
+                for dy, mask in masks:
+                    if bits[y + dy] & mask:
+                        break
+                else:
+                    y += 1
+                    continue
+                break
+        fig.y = y - 1
+        self.freeze()
+
+    def remove_row(self, rows=None):
+        """Same as engine.tetris.remove_row(), on the row bitmasks."""
+        full = self.full
+        bits = self.bits
+        if rows is None:
+            if full not in bits:
+                return
+            cleared = [i for i, row in enumerate(bits) if row == full]
+        else:
+            # row 0 may have been left full by an earlier call, see below
+            cleared = sorted(i for i in set(rows) | {0} if bits[i] == full)
+        # The list engine never checks row 0 on its own, it only reaches it
+        # once a lower row has been cleared and shifted it down.
+        if not cleared or cleared == [0]:
+            return
+
+        colors = self.colors
+        for i in reversed(cleared):
+            del bits[i]
+            del colors[i]
+        bits[0:0] = [0] * len(cleared)
+        colors[0:0] = [{} for _ in cleared]
+        self.touch(board=True)
+
+        score = self.score
+        self.score += len(cleared)
+        self.lvl += self.score // 5 - score // 5
+
+    def freeze(self):
+        fig = self.fig
+        x, y = fig.x, fig.y
+        bits = self.bits
+        rows = []
+        for dy, mask in engine.GEOMETRY[fig.type][fig.rotation].row_masks:
+            # a piece stuck at spawn freezes at y = -1 and, through negative
+            # indexing, into the bottom row, like the list engine
+            bits[y + dy] |= mask << x if x >= 0 else mask >> -x
+            rows.append((y + dy) % self.rows)
+        colors = self.colors
+        color = fig.color
+        for dy, dx in engine.GEOMETRY[fig.type][fig.rotation].cells:
+            colors[y + dy][x + dx] = color
+        self.touch(board=True)
+
+        self.remove_row(rows)
+        self.new_shape()
+        if self.collision():
+            self.end = True
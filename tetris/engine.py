@@ -0,0 +1,481 @@
+"""
+Headless Tetris rules.
+
+Everything needed to play a game lives here: the piece definitions, the board
+and the movement / line-clear rules. Nothing in this module imports pygame, so
+games can be simulated on machines without a display. `tetris/tetris.py` is the
+pygame frontend built on top of it.
+"""
+import random
+from array import array
+from collections import namedtuple
+from itertools import count
+
+# Board size used by dev_main: a 300x380 pixel play field in 20px cells.
+ROWS = 19
+COLS = 15
+
+
+class shape:
+    version = {
+        "I": [[1, 5, 9, 13], [4, 5, 6, 7]],
+        "Z": [[4, 5, 9, 10], [2, 6, 5, 9]],
+        "S": [[6, 7, 9, 10], [1, 5, 6, 10]],
+        "L": [[1, 2, 5, 9], [0, 4, 5, 6], [1, 5, 9, 8], [4, 5, 6, 10]],
+        "J": [[1, 2, 6, 10], [5, 6, 7, 9], [2, 6, 10, 11], [3, 5, 6, 7]],
+        "T": [[1, 4, 5, 6], [1, 4, 5, 9], [4, 5, 6, 9], [1, 5, 6, 9]],
+        "O": [[1, 2, 5, 6]],
+    }
+    shapes = ["I", "Z", "S", "L", "J", "T", "O"]
+
+    def __init__(self, x, y, type=None, color=None):
+        self.x = x
+        self.y = y
+        self.type = type if type is not None else random.choice(self.shapes)
+        self.shape = self.version[self.type]
+        self.color = color if color is not None else random.randint(1, 4)
+        self.rotation = 0
+
+    def img(self):
+        return self.shape[self.rotation]
+
+    def rotate(self):
+        self.rotation = (self.rotation + 1) % len(self.shape)
+
+
+# Everything callers need to know about one rotation of a piece, relative to
+# the piece's (x, y) origin in its 4x4 box:
+#   cells      ((dy, dx), ...) in row-major order
+#   min/max_*  bounding box of the cells
+#   bottom     ((dx, dy), ...) lowest cell of every occupied column
+#   row_masks  ((dy, mask), ...) with bit dx set for every cell in row dy
+piece_geometry = namedtuple(
+    "piece_geometry",
+    ["cells", "min_dy", "max_dy", "min_dx", "max_dx", "bottom", "row_masks"],
+)
+
+
+def make_geometry(cells):
+    cells = tuple(sorted(cells))
+    bottom = {}
+    masks = {}
+    for dy, dx in cells:
+        bottom[dx] = max(bottom.get(dx, dy), dy)
+        masks[dy] = masks.get(dy, 0) | (1 << dx)
+    return piece_geometry(
+        cells=cells,
+        min_dy=min(dy for dy, _ in cells),
+        max_dy=max(dy for dy, _ in cells),
+        min_dx=min(dx for _, dx in cells),
+        max_dx=max(dx for _, dx in cells),
+        bottom=tuple(sorted(bottom.items())),
+        row_masks=tuple(sorted(masks.items())),
+    )
+
+
+# GEOMETRY[type][rotation], indexed the same way as shape.version.
+GEOMETRY = {
+    name: tuple(make_geometry((k // 4, k % 4) for k in img) for img in rotations)
+    for name, rotations in shape.version.items()
+}
+
+
+# byte tables for PieceStream: a top byte's value for each bit shift, and
+# a type / colour draw's share of a piece code
+_SHIFT = [bytes(b >> shift for b in range(256)) for shift in range(8)]
+_TYPE_CODE = bytes(b << 3 & 0xFF for b in range(256))
+_COLOR_CODE = bytes(b + 1 & 0xFF for b in range(256))
+
+
+class PieceStream:
+    """
+    Seeded sequence of (type, color) pairs for the pieces of one game.
+
+    Pieces are drawn from a private random.Random, `chunk` at a time, into a
+    byte array (type index in the high bits, colour in the low three), so
+    handing out the next piece is an index and a lookup. Types are drawn
+    uniformly like `shape` does, or from shuffled bags of all seven with
+    bag=True. The same seed always gives the same stream.
+    """
+
+    def __init__(self, seed=None, bag=False, chunk=4096):
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.bag = bag
+        self.chunk = chunk
+        self.rng = random.Random(seed)
+        self.codes = array("B")
+        self.pos = 0
+        # top bytes of generator output fetched ahead, see _tops()
+        self.tops = b""
+        self.pos_tops = 0
+
+    def _fill(self, n):
+        kinds = len(shape.shapes)
+        if self.bag:
+            types = self._bags(n, kinds)
+        else:
+            types = self._draw(n, kinds)
+        colors = self._draw(len(types), 4)
+        # type << 3 | colour, computed on whole byte strings
+        codes = (int.from_bytes(types.translate(_TYPE_CODE), "little")
+                 | int.from_bytes(colors.translate(_COLOR_CODE), "little"))
+        self.codes.frombytes(codes.to_bytes(len(types), "little"))
+
+    # random.Random draws randrange(bound), for a bound below 256, from one
+    # 32-bit generator output per try, keeping its top bound.bit_length()
+    # bits and retrying above the bound. Only the top byte of each output
+    # matters, so outputs are fetched in bulk and kept as a byte string of
+    # top bytes; the draws below take them in the same order and therefore
+    # deal the same pieces as randrange(), randint() and shuffle() would.
+
+    def _tops(self, m):
+        """At least m top bytes not used yet, from self.pos_tops on."""
+        tops = self.tops
+        if len(tops) - self.pos_tops < m:
+            more = m - (len(tops) - self.pos_tops) + 256
+            data = self.rng.getrandbits(32 * more).to_bytes(4 * more, "little")
+            tops = self.tops = tops[self.pos_tops:] + data[3::4]
+            self.pos_tops = 0
+        return tops
+
+    def _draw(self, n, bound):
+        """n draws of randrange(bound), as a byte string."""
+        shift = 8 - bound.bit_length()
+        reject = bytes(range(bound << shift, 256))
+        # fetch the expected number of outputs, then extend the span by the
+        # shortfall until it holds exactly n accepted bytes (adding the
+        # shortfall can never overshoot)
+        tops = self._tops(n * 256 // (bound << shift) + 64)
+        start = self.pos_tops
+        m = got = 0
+        while got < n:
+            step = n - got
+            if start + m + step > len(tops):
+                tops = self._tops(m + step)
+                start = self.pos_tops
+            got += len(tops[start + m:start + m + step].translate(None, reject))
+            m += step
+        self.pos_tops = start + m
+        return tops[start:start + m].translate(_SHIFT[shift], reject)
+
+    def _bags(self, n, kinds):
+        """Piece types in shuffled bags, at least n, as a byte string."""
+        types = bytearray()
+        bounds = [(i, i + 1, 8 - (i + 1).bit_length()) for i in range(kinds - 1, 0, -1)]
+        while len(types) < n:
+            # one random.shuffle() of the bag
+            tops = self._tops(64)
+            pos = self.pos_tops
+            bag = list(range(kinds))
+            for i, bound, shift in bounds:
+                while True:
+                    j = tops[pos] >> shift
+                    pos += 1
+                    if j < bound:
+                        break
+                bag[i], bag[j] = bag[j], bag[i]
+            self.pos_tops = pos
+            types.extend(bag)
+        return bytes(types)
+
+    def __getitem__(self, i):
+        """The i-th piece of the stream, counting from the first spawned one."""
+        while i >= len(self.codes):
+            self._fill(self.chunk)
+        code = self.codes[i]
+        return shape.shapes[code >> 3], code & 7
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        piece = self[self.pos]
+        self.pos += 1
+        return piece
+
+
+# Engine method behind every action accepted by apply_action(). The bot's
+# key letters ("a", "d", "w", "s", " ") are accepted as aliases.
+ACTIONS = {
+    "left": "left",
+    "right": "right",
+    "rotate": "rotate",
+    "fast_drop": "fast_drop",
+    "freefall": "freefall",
+    "move": "move",
+    "a": "left",
+    "d": "right",
+    "w": "rotate",
+    "s": "fast_drop",
+    " ": "freefall",
+}
+
+# Generation numbers come from one process-wide counter, so no two states of
+# any games (including a game restarted with __init__) share a generation.
+_generations = count(1)
+
+
+class tetris:
+    def __init__(self, rows=ROWS, cols=COLS, seed=None, pieces=None):
+        """
+        Pieces come from `pieces`, any iterator of (type, color) pairs, or
+        else from a PieceStream seeded with `seed`. Without either, the seed
+        is drawn from the global `random` module, so random.seed() still
+        makes a game repeatable.
+        """
+        if pieces is None:
+            pieces = PieceStream(seed)
+        self.pieces = pieces
+        self.seed = getattr(pieces, "seed", seed)
+        self.touch(board=True)
+        self.grid = [[0 for _ in range(cols)] for _ in range(rows)]
+        # filled cells per row, kept up to date by freeze() and remove_row()
+        self.fill = [0] * rows
+        self.fill_generation = self.board_generation
+        self.current_shape = None
+        self.rows = rows
+        self.cols = cols
+        self.lvl = 1
+        self.next = None
+        self.end = False
+        self.score = 0
+        self.new_shape()
+
+    def touch(self, board=False):
+        """
+        Record a change of state. `generation` changes on every change of
+        the board or the pieces, `board_generation` only when the locked
+        cells change (board=True). The engine's own methods call this; code
+        that edits `grid` or `fig` directly should call it afterwards.
+        """
+        self.generation = next(_generations)
+        if board:
+            self.board_generation = self.generation
+
+    def new_shape(self):
+        if not self.next:
+            self.next = shape(5, 0, *next(self.pieces))
+        self.fig = self.next
+        self.next = shape(5, 0, *next(self.pieces))
+        self.touch()
+
+    def collision(self) -> bool:
+        fig = self.fig
+        if not fig:
+            return False
+        geo = GEOMETRY[fig.type][fig.rotation]
+        x, y = fig.x, fig.y
+        if (
+            y + geo.max_dy >= self.rows
+            or y + geo.min_dy < 0
+            or x + geo.min_dx < 0
+            or x + geo.max_dx >= self.cols
+        ):
+            return True
+        grid = self.grid
+        for dy, dx in geo.cells:
+            if grid[y + dy][x + dx] > 0:
+                return True
+        return False
+
+    def row_fill(self):
+        """
+        `fill`, the filled cells of every row, recounted first if the board
+        was changed from outside the engine (see touch()).
+        """
+        if self.fill_generation != self.board_generation:
+            self.fill = [sum(1 for cell in row if cell > 0) for row in self.grid]
+            self.fill_generation = self.board_generation
+        return self.fill
+
+    def remove_row(self, rows=None):
+        """
+        Clear the full rows, shift everything above them down and score a
+        line for each (and a level for every 5 lines). `rows` limits the
+        check to the rows a piece was just frozen into.
+        """
+        fill = self.row_fill()
+        cols = self.cols
+        if rows is None:
+            full = [i for i in range(self.rows) if fill[i] == cols]
+        else:
+            # row 0 may have been left full by an earlier call, see below
+            full = sorted(i for i in set(rows) | {0} if fill[i] == cols)
+        # Row 0 is never cleared on its own, only together with a lower row
+        # (the original row-by-row scan stopped at row 1 and only saw row 0
+        # once a clear had shifted it down).
+        if not full or full == [0]:
+            return
+
+        grid = self.grid
+        for i in reversed(full):
+            del grid[i]
+            del fill[i]
+        grid[0:0] = [[0] * cols for _ in full]
+        fill[0:0] = [0] * len(full)
+        self.touch(board=True)
+        self.fill_generation = self.board_generation
+
+        score = self.score
+        self.score += len(full)
+        self.lvl += self.score // 5 - score // 5
+
+    def freeze(self):
+        fig = self.fig
+        # a board edited from outside since the last freeze is checked in full
+        recounted = self.fill_generation != self.board_generation
+        fill = self.row_fill()
+        grid = self.grid
+        rows = []
+        for dy, dx in GEOMETRY[fig.type][fig.rotation].cells:
+            # a piece stuck at spawn freezes at y = -1, over filled cells
+            # and, through negative indexing, into the bottom row
+            r = fig.y + dy
+            row = grid[r]
+            if row[fig.x + dx] <= 0:
+                fill[r] += 1
+            row[fig.x + dx] = fig.color
+            rows.append(r % self.rows)
+        self.touch(board=True)
+        self.fill_generation = self.board_generation
+
+        self.remove_row(None if recounted else rows)
+        self.new_shape()
+        if self.collision():
+            self.end = True
+
+    def apply_action(self, action) -> bool:
+        """
+        Apply one action right away: a name from ACTIONS, or the macro
+        ("place", rotation, x), see place(). Returns False, doing nothing,
+        for an unknown or unreachable action or once the game is over.
+        """
+        if self.end:
+            return False
+        if isinstance(action, tuple):
+            if len(action) == 3 and action[0] == "place":
+                return self.place(action[1], action[2])
+            return False
+        # lists and other unhashable input cannot be looked up in ACTIONS
+        name = ACTIONS.get(action) if isinstance(action, str) else None
+        if name is None:
+            return False
+        getattr(self, name)()
+        return True
+
+    def find_path(self, rotation, x):
+        """
+        Shortest list of "rotate" / "left" / "right" moves that takes the
+        falling piece to (rotation, x) without leaving its row, checked
+        with collision() at every step. None if there is no such path.
+        """
+        fig = self.fig
+        if not fig or not 0 <= rotation < len(fig.shape):
+            return None
+        start = (fig.rotation, fig.x)
+        target = (rotation, x)
+        parents = {start: None}
+        frontier = [start]
+        try:
+            while frontier and target not in parents:
+                next_frontier = []
+                for state in frontier:
+                    r, cx = state
+                    for move, nxt in (("rotate", ((r + 1) % len(fig.shape), cx)),
+                                      ("left", (r, cx - 1)),
+                                      ("right", (r, cx + 1))):
+                        if nxt in parents:
+                            continue
+                        fig.rotation, fig.x = nxt
+                        if self.collision():
+                            continue
+                        parents[nxt] = (state, move)
+                        next_frontier.append(nxt)
+                frontier = next_frontier
+        finally:
+            fig.rotation, fig.x = start
+        if target not in parents:
+            return None
+        path = []
+        state = target
+        while parents[state] is not None:
+            state, move = parents[state]
+            path.append(move)
+        path.reverse()
+        return path
+
+    def place(self, rotation, x) -> bool:
+        """
+        Macro action: turn and shift the falling piece to (rotation, x)
+        along find_path() and hard-drop it, all at once. Returns False,
+        leaving the piece where it is, if the target cannot be reached.
+        """
+        path = self.find_path(rotation, x)
+        if path is None:
+            return False
+        for move in path:
+            getattr(self, move)()
+        self.freefall()
+        return True
+
+    def step(self, actions=(), gravity=False) -> int:
+        """
+        One logic tick: apply `actions` in order, then let the piece fall
+        one row if `gravity` is set and none of the actions locked it.
+        Returns the number of actions applied.
+        """
+        fig = self.fig
+        applied = 0
+        for action in actions:
+            applied += self.apply_action(action)
+        if gravity and not self.end and self.fig is fig:
+            self.move()
+        return applied
+
+    def move(self):
+        self.fig.y += 1
+        if self.collision():
+            self.fig.y -= 1
+            self.freeze()
+        else:
+            self.touch()
+
+    def left(self):
+        self.fig.x -= 1
+        if self.collision():
+            self.fig.x += 1
+        else:
+            self.touch()
+
+    def right(self):
+        self.fig.x += 1
+        if self.collision():
+            self.fig.x -= 1
+        else:
+            self.touch()
+
+    def freefall(self):
+        while not self.collision():
+            self.fig.y += 1
+        self.fig.y -= 1
+        self.freeze()
+
+    def fast_drop(self):
+        y = self.fig.y
+        for _ in range(3):
+            self.fig.y += 1
+            if self.collision():
+                self.fig.y -= 1
+                break
+        if self.fig.y != y:
+            self.touch()
+
+    def rotate(self):
+        old_rotation = self.fig.rotation
+        self.fig.rotate()
+        if self.collision():
+            self.fig.rotation = old_rotation
+        else:
+            self.touch()
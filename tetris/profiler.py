@@ -0,0 +1,161 @@
+"""
+Opt-in frame profiler.
+
+Set TETRIS_PROFILE to time every phase of the dev_main loop (event pump,
+input, bot, game logic, rendering, display.update and the clock.tick
+sleep) and the bot controller (observation build and bot.decide). With
+TETRIS_PROFILE=1 the numbers are shown in a small overlay; any other value
+is a file the report is written to as JSON on exit instead.
+
+Each phase goes into a `Histogram` of fixed log-spaced buckets, so adding
+a sample is a perf_counter() call, a bisect and an increment. Frames whose
+work (everything but the sleep) takes longer than the 60 fps budget count
+as overruns; decisions that came more than one BOT_INTERVAL_MS late count
+as missed intervals.
+"""
+import atexit
+import json
+import os
+import time
+from bisect import bisect_left
+
+# bucket upper bounds in seconds: 1us to ~17s, four buckets per doubling
+_EDGES = [1e-6 * 2 ** (i / 4) for i in range(97)]
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.buckets[bisect_left(_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(_EDGES[i], self.max) if i < len(_EDGES) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        ms = 1000
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * ms if self.count else 0.0,
+            "p50_ms": self.percentile(50) * ms,
+            "p90_ms": self.percentile(90) * ms,
+            "p99_ms": self.percentile(99) * ms,
+            "max_ms": self.max * ms,
+            # (upper bound in ms, count) of every non-empty bucket
+            "buckets": [[_EDGES[i] * ms if i < len(_EDGES) else None, n]
+                        for i, n in enumerate(self.buckets) if n],
+        }
+
+
+class Profiler:
+    def __init__(self, budget_ms: float = 1000 / 60) -> None:
+        self.budget = budget_ms / 1000
+        self.phases = {}
+        self.counters = {"frames": 0, "overruns": 0, "missed_intervals": 0}
+        self.frame_start = None
+        self.mark = None
+        self.sleep = 0.0
+        self.overlay = False
+
+    def histogram(self, name: str) -> Histogram:
+        hist = self.phases.get(name)
+        if hist is None:
+            hist = self.phases[name] = Histogram()
+        return hist
+
+    def add(self, name: str, seconds: float) -> None:
+        self.histogram(name).add(seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def start_frame(self) -> None:
+        self.frame_start = self.mark = time.perf_counter()
+        self.sleep = 0.0
+
+    def lap(self, name: str) -> None:
+        """Charge the time since the previous lap (or the frame start) to `name`."""
+        now = time.perf_counter()
+        self.add(name, now - self.mark)
+        if name == "sleep":
+            self.sleep += now - self.mark
+        self.mark = now
+
+    def end_frame(self) -> None:
+        total = time.perf_counter() - self.frame_start
+        self.add("frame", total)
+        self.counters["frames"] += 1
+        if total - self.sleep > self.budget:
+            self.counters["overruns"] += 1
+
+    def timed(self, name: str, fn):
+        """`fn` wrapped so every call is added to `name`, from any thread."""
+        # made up front so other threads never see the phases dict grow
+        hist = self.histogram(name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.add(time.perf_counter() - start)
+        return wrapper
+
+    def report(self) -> dict:
+        return {
+            "budget_ms": self.budget * 1000,
+            "counters": dict(self.counters),
+            "phases": {name: hist.summary() for name, hist in self.phases.items()},
+        }
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def overlay_lines(self):
+        """A few lines of text for the on-screen overlay."""
+        c = self.counters
+        frame = self.phases.get("frame")
+        lines = []
+        if frame and frame.count:
+            lines.append("frame p50 %.1f p99 %.1f ms, over %d/%d" % (
+                frame.percentile(50) * 1000, frame.percentile(99) * 1000,
+                c["overruns"], c["frames"]))
+        for name, hist in self.phases.items():
+            if name != "frame" and hist.count:
+                lines.append("%-11s %.2f ms  p99 %.2f" % (
+                    name, hist.total / hist.count * 1000, hist.percentile(99) * 1000))
+        lines.append("missed intervals %d" % c["missed_intervals"])
+        return lines
+
+
+def _from_env():
+    setting = os.getenv("TETRIS_PROFILE")
+    if not setting or setting == "0":
+        return None
+    profiler = Profiler()
+    profiler.overlay = setting == "1"
+    if not profiler.overlay:
+        atexit.register(profiler.dump, setting)
+    return profiler
+
+
+# the process-wide profiler, None unless TETRIS_PROFILE is set
+PROFILER = _from_env()
@@ -0,0 +1,338 @@
+"""
+Compact binary game recordings.
+
+A replay file is the magic b"TRPL\\x01" followed by a stream of records,
+most of them a single byte:
+
+    GAME      0xF0, seed u64, rows u8, cols u8, bag u8, keyframe_every u16
+    INPUT     0x00-0x05, one engine call (see ACTIONS)
+    PLACE     0x10 | rotation, x i8: the piece moved to (rotation, x) along
+              game.place() and dropped
+    KEYFRAME  0xF1, piece u32, score u32, lvl u16, then the board bit-packed
+              row-major, one bit per cell (ceil(rows * cols / 8) bytes)
+    END       0xF2, followed by the index
+
+The pieces themselves are not stored: a game is replayed from its seed
+through `engine.PieceStream`. Keyframes are written every `keyframe_every`
+pieces, right after the piece has been frozen and the next one spawned, so
+a reader can restore a game there instead of replaying it from the start.
+They only keep occupancy, so cells restored from a keyframe all get colour
+1.
+
+`ReplayWriter.close()` appends an index of every game start and keyframe,
+(game u32, piece u32, offset u64) each, and a trailer (index offset u64,
+count u32, b"TIDX"). Files that were never closed are still readable:
+`ReplayFile` then rebuilds the index by scanning the records.
+"""
+import mmap
+import struct
+
+from tetris.engine import PieceStream, shape, tetris
+
+MAGIC = b"TRPL\x01"
+
+# engine method for each INPUT code
+ACTIONS = ("move", "left", "right", "rotate", "fast_drop", "freefall")
+CODES = {name: code for code, name in enumerate(ACTIONS)}
+
+GAME = 0xF0
+KEYFRAME = 0xF1
+END = 0xF2
+PLACE = 0x10
+
+_GAME = struct.Struct("<QBBBH")
+_KEYFRAME = struct.Struct("<IIH")
+_PLACE_X = struct.Struct("<b")
+_ENTRY = struct.Struct("<IIQ")
+_TRAILER = struct.Struct("<QI4s")
+
+
+def pack_board(grid) -> bytes:
+    """Occupancy of `grid`, bit r * cols + c set for a filled (r, c)."""
+    cols = len(grid[0])
+    bits = 0
+    for r, row in enumerate(grid):
+        for c, cell in enumerate(row):
+            if cell:
+                bits |= 1 << (r * cols + c)
+    return bits.to_bytes((len(grid) * cols + 7) // 8, "little")
+
+
+def unpack_board(data, rows: int, cols: int, color: int = 1):
+    bits = int.from_bytes(data, "little")
+    return [[color if bits >> (r * cols + c) & 1 else 0 for c in range(cols)]
+            for r in range(rows)]
+
+
+class ReplayWriter:
+    """
+    Records games into `path`. record(game) starts a new game in the file
+    and from then on logs every input the game receives; place() drops the
+    falling piece at a target and logs it as a single PLACE record. Call
+    close() (or use the writer as a context manager) to write the index.
+    """
+
+    def __init__(self, path: str, keyframe_every: int = 32) -> None:
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.keyframe_every = keyframe_every
+        self.index = []
+        self.games = -1
+        self.game = None
+        self.pieces = 0
+        # inside place(): the moves it makes are not logged one by one
+        self.placing = False
+
+    def record(self, game) -> None:
+        """Start recording `game`, which must be in its initial state."""
+        pieces = game.pieces
+        if not isinstance(pieces, PieceStream) or not 0 <= pieces.seed < 1 << 64:
+            raise ValueError("only games dealt from a PieceStream with a 64-bit seed can be recorded")
+        self.games += 1
+        self.game = game
+        self.pieces = 0
+        self.index.append((self.games, 0, self.file.tell()))
+        self.file.write(bytes([GAME]) + _GAME.pack(
+            pieces.seed, game.rows, game.cols, pieces.bag, self.keyframe_every))
+        # the wrappers log to whichever writer is recording the game; they
+        # survive game.__init__, so a restarted game is only wrapped once
+        if not getattr(game, "_replay_wrapped", False):
+            for name in ACTIONS:
+                setattr(game, name, self._input(game, name, getattr(game, name)))
+            game.freeze = self._freeze(game, game.freeze)
+            game._replay_wrapped = True
+        game._replay_writer = self
+
+    def _input(self, game, name, method):
+        code = bytes([CODES[name]])
+
+        def wrapper():
+            writer = game._replay_writer
+            if writer is not None and writer.game is game and not writer.placing:
+                writer.file.write(code)
+            method()
+        return wrapper
+
+    def _freeze(self, game, method):
+        def wrapper():
+            method()
+            writer = game._replay_writer
+            if writer is not None and writer.game is game and not writer.placing:
+                writer._frozen()
+        return wrapper
+
+    def _frozen(self) -> None:
+        self.pieces += 1
+        if self.pieces % self.keyframe_every:
+            return
+        game = self.game
+        self.index.append((self.games, self.pieces, self.file.tell()))
+        self.file.write(bytes([KEYFRAME]) + _KEYFRAME.pack(self.pieces, game.score, game.lvl)
+                        + pack_board(game.grid))
+
+    def place(self, rotation: int, x: int) -> None:
+        """
+        Drop the recorded game's falling piece at (rotation, x) with
+        game.place() and log it as one PLACE record. Raises ValueError,
+        writing nothing, if the target is out of range or unreachable.
+        """
+        game = self.game
+        if not 0 <= rotation < len(game.fig.shape):
+            raise ValueError("rotation %d out of range for a %s piece" % (rotation, game.fig.type))
+        if not -128 <= x <= 127:
+            raise ValueError("x %d does not fit a PLACE record" % x)
+        self.placing = True
+        try:
+            placed = game.place(rotation, x)
+        finally:
+            self.placing = False
+        if not placed:
+            raise ValueError("the falling piece cannot reach rotation %d, x %d" % (rotation, x))
+        self.file.write(bytes([PLACE | rotation]) + _PLACE_X.pack(x))
+        self._frozen()
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        if self.game is not None:
+            self.game._replay_writer = None
+        index_offset = self.file.tell() + 1
+        self.file.write(bytes([END]))
+        for entry in self.index:
+            self.file.write(_ENTRY.pack(*entry))
+        self.file.write(_TRAILER.pack(index_offset, len(self.index), b"TIDX"))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ReplayFile:
+    """
+    Memory-mapped reader. `games` holds one dict per recorded game (seed,
+    rows, cols, bag, keyframe_every, offset) and `index` the (game, piece,
+    offset) entries of every game start and keyframe.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buf[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a replay file" % path)
+        self.index = self._read_index()
+        if self.index is None:
+            self.index = [(g, p, o) for o, kind, g, p in self._scan() if kind in (GAME, KEYFRAME)]
+        self.games = []
+        for g, piece, offset in self.index:
+            if piece == 0:
+                seed, rows, cols, bag, every = _GAME.unpack_from(self.buf, offset + 1)
+                self.games.append({"seed": seed, "rows": rows, "cols": cols, "bag": bool(bag),
+                                   "keyframe_every": every, "offset": offset})
+
+    def _read_index(self):
+        buf = self.buf
+        if len(buf) < len(MAGIC) + _TRAILER.size:
+            return None
+        index_offset, count, tag = _TRAILER.unpack_from(buf, len(buf) - _TRAILER.size)
+        if tag != b"TIDX" or index_offset + count * _ENTRY.size + _TRAILER.size != len(buf):
+            return None
+        return [_ENTRY.unpack_from(buf, index_offset + i * _ENTRY.size) for i in range(count)]
+
+    def _scan(self):
+        """(offset, tag, game, piece) of every whole GAME and KEYFRAME record."""
+        buf = self.buf
+        offset = len(MAGIC)
+        game = -1
+        board_bytes = 0
+        while offset < len(buf):
+            tag = buf[offset]
+            size = self.record_size(tag, board_bytes)
+            if size is None or offset + size > len(buf):
+                return
+            if tag == GAME:
+                game += 1
+                _, rows, cols, _, _ = _GAME.unpack_from(buf, offset + 1)
+                board_bytes = (rows * cols + 7) // 8
+                yield offset, tag, game, 0
+            elif tag == KEYFRAME:
+                yield offset, tag, game, _KEYFRAME.unpack_from(buf, offset + 1)[0]
+            offset += size
+
+    @staticmethod
+    def record_size(tag: int, board_bytes: int):
+        """Length of the record starting with `tag`, or None at END or on garbage."""
+        if tag < len(ACTIONS):
+            return 1
+        if tag & ~3 == PLACE:
+            return 1 + _PLACE_X.size
+        if tag == GAME:
+            return 1 + _GAME.size
+        if tag == KEYFRAME:
+            return 1 + _KEYFRAME.size + board_bytes
+        return None
+
+    def keyframes(self, game: int):
+        """[(piece, offset), ...] of the game's start and keyframes, in order."""
+        return [(p, o) for g, p, o in self.index if g == game]
+
+    def close(self) -> None:
+        self.buf.close()
+
+
+class Replayer:
+    """
+    Replays one game of a ReplayFile on a headless engine (any
+    `engine.tetris` subclass via `cls`) without rendering. step() applies
+    one record; seek(piece) restores the nearest keyframe and fast-forwards
+    from there.
+    """
+
+    def __init__(self, replay: ReplayFile, game: int = 0, cls=tetris) -> None:
+        self.replay = replay
+        self.info = replay.games[game]
+        self.number = game
+        self.cls = cls
+        self.board_bytes = (self.info["rows"] * self.info["cols"] + 7) // 8
+        self.restart()
+
+    def restart(self) -> None:
+        info = self.info
+        self.stream = PieceStream(info["seed"], info["bag"])
+        self.game = self.cls(info["rows"], info["cols"], pieces=self.stream)
+        self.pieces = 0
+        self.offset = info["offset"] + 1 + _GAME.size
+
+    def _load_keyframe(self, offset: int) -> None:
+        buf = self.replay.buf
+        piece, score, lvl = _KEYFRAME.unpack_from(buf, offset + 1)
+        start = offset + 1 + _KEYFRAME.size
+        info = self.info
+        game = self.game
+        game.grid = unpack_board(buf[start:start + self.board_bytes], info["rows"], info["cols"])
+        game.score = score
+        game.lvl = lvl
+        # after `piece` freezes the falling piece is the stream's piece-th and
+        # the preview the next one
+        game.fig = shape(5, 0, *self.stream[piece])
+        game.next = shape(5, 0, *self.stream[piece + 1])
+        self.stream.pos = piece + 2
+        game.end = game.collision()
+        game.touch(board=True)
+        self.pieces = piece
+        self.offset = start + self.board_bytes
+
+    def step(self):
+        """
+        Apply the next record. Returns its kind ("input", "place" or
+        "keyframe") or None once the game's records are exhausted.
+        """
+        buf = self.replay.buf
+        offset = self.offset
+        if offset >= len(buf):
+            return None
+        tag = buf[offset]
+        size = ReplayFile.record_size(tag, self.board_bytes)
+        if size is None or tag == GAME or offset + size > len(buf):
+            return None
+        self.offset = offset + size
+        game = self.game
+        if tag < len(ACTIONS):
+            before = game.fig
+            getattr(game, ACTIONS[tag])()
+            if game.fig is not before:
+                self.pieces += 1
+            return "input"
+        if tag == KEYFRAME:
+            return "keyframe"
+        rotation, x = tag & 3, _PLACE_X.unpack_from(buf, offset + 1)[0]
+        if not game.place(rotation, x):
+            raise ValueError("PLACE record at offset %d: the piece cannot reach rotation %d, x %d"
+                             % (offset, rotation, x))
+        self.pieces += 1
+        return "place"
+
+    def seek(self, piece: int):
+        """Restore the game as it was right after `piece` pieces were placed."""
+        nearest = None
+        for p, offset in self.replay.keyframes(self.number):
+            if 0 < p <= piece:
+                nearest = (p, offset)
+        if nearest and (nearest[0] > self.pieces or piece < self.pieces):
+            self._load_keyframe(nearest[1])
+        elif piece < self.pieces:
+            self.restart()
+        while self.pieces < piece and self.step() is not None:
+            pass
+        return self.game
+
+    def run(self):
+        """Fast-forward to the end of the recording and return the engine."""
+        while self.step() is not None:
+            pass
+        return self.game
@@ -0,0 +1,384 @@
+"""
+Headless game server for bots that run in another process.
+
+`GameServer` hosts any number of headless games on an asyncio server (TCP on
+localhost or a Unix socket). Every connection owns its own games and drives
+them in batches: one message creates, steps, observes or resets many games
+and gets one message back with an observation of each, so a trainer keeps
+hundreds of games busy with a single round trip per step.
+
+Messages in both directions are a u32 length followed by the payload, all
+little-endian. The first payload byte is the message type:
+
+    N  new games     count u16, seed u64, rows u8, cols u8, bag u8, auto_reset u8
+    S  step          gravity u8, n u16, then n x (game u16, action u8, x i8)
+    O  observe       n u16, then n x game u16 (n = 0: every game)
+    R  reset         n u16, then n x game u16 (n = 0: every game)
+
+Actions use the replay codes: 0-5 are the engine inputs in `replay.ACTIONS`
+order, 0x10 | rotation with `x` is the ("place", rotation, x) macro, and
+NOOP (0xFF) applies nothing, so the step is just gravity. Games are
+numbered in creation order.
+
+Every request is answered with an observation batch, or with "E" and an
+error text:
+
+    O  n u16, then n x (game u16, flags u8, score u32, lvl u16, piece u8,
+       rotation u8, x i8, y i8, next u8) + board
+
+`piece` and `next` index `shape.shapes` (0xFF for none). The board holds the
+locked cells only, one little-endian bit row of ceil(cols / 8) bytes per
+row, bit c set for a filled column c; the falling piece is given by its
+type, rotation and position. Flag 1 means the game is over. With
+auto_reset a finished game is restarted straight away: its observation
+then has flag 2 as well, `score` is the final score of the finished game
+and everything else describes the new one.
+
+Each connection seeds a random.Random with the seed of its first "N" and
+draws the piece seed of every game it starts from there, so a client that
+sends the same requests gets the same games.
+
+    python -m tetris.server --port 7777
+    python -m tetris.server --unix /tmp/tetris.sock
+
+`GameClient` is a blocking client for trainers.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import struct
+
+from tetris.bitboard import BitboardTetris
+from tetris.engine import ACTIONS as ENGINE_ACTIONS, COLS, ROWS, PieceStream, shape
+from tetris.replay import ACTIONS, CODES, PLACE
+
+NOOP = 0xFF
+ENDED = 1
+RESET = 2
+
+_LENGTH = struct.Struct("<I")
+_COUNT = struct.Struct("<H")
+_NEW = struct.Struct("<HQBBBB")
+_STEP = struct.Struct("<BH")
+_ACTION = struct.Struct("<HBb")
+_OBS = struct.Struct("<HBIHBBbbB")
+
+_TYPES = {name: i for i, name in enumerate(shape.shapes)}
+
+
+def encode_action(action):
+    """
+    (code, x) for an engine action: a name or key from engine.ACTIONS,
+    ("place", rotation, x) as a Bot in macro mode returns it, or None.
+    Raises ValueError for anything that does not fit an action code and a
+    signed-byte x.
+    """
+    if action is None:
+        return NOOP, 0
+    if isinstance(action, tuple):
+        if len(action) == 3 and action[0] == "place":
+            _, rotation, x = action
+            if not 0 <= rotation <= 3:
+                raise ValueError("rotation %r out of range 0-3 in %r" % (rotation, action))
+            if not -128 <= x <= 127:
+                raise ValueError("x %r does not fit a signed byte in %r" % (x, action))
+            return PLACE | rotation, x
+        raise ValueError("unknown action %r" % (action,))
+    name = ENGINE_ACTIONS.get(action)
+    if name is None:
+        raise ValueError("unknown action %r" % (action,))
+    return CODES[name], 0
+
+
+def decode_action(code: int, x: int):
+    """The engine action for (code, x), None for NOOP."""
+    if code == NOOP:
+        return None
+    if code < len(ACTIONS):
+        return ACTIONS[code]
+    if code & ~3 == PLACE:
+        return ("place", code & 3, x)
+    raise ValueError("unknown action code %d" % code)
+
+
+def board_rows(game):
+    """Locked cells of `game` as one int per row, bit c set for a filled column c."""
+    bits = getattr(game, "bits", None)
+    if bits is not None:
+        return bits
+    rows = []
+    for row in game.grid:
+        value = 0
+        for c, cell in enumerate(row):
+            if cell:
+                value |= 1 << c
+        rows.append(value)
+    return rows
+
+
+class Session:
+    """The games of one connection and the random.Random their seeds come from."""
+
+    def __init__(self, cls) -> None:
+        self.cls = cls
+        self.games = []
+        self.rng = None
+        self.rows = ROWS
+        self.cols = COLS
+        self.bag = False
+        self.auto_reset = False
+
+    def new_games(self, count: int, seed: int, rows: int, cols: int, bag: bool, auto_reset: bool):
+        if self.rng is None:
+            self.rng = random.Random(seed)
+        elif self.games and (rows, cols) != (self.rows, self.cols):
+            raise ValueError("every game of a connection has the same board size")
+        self.rows, self.cols = rows, cols
+        self.bag = bag
+        self.auto_reset = auto_reset
+        start = len(self.games)
+        for _ in range(count):
+            self.games.append(self._start())
+        return [(i, 0) for i in range(start, len(self.games))]
+
+    def _start(self):
+        return self.cls(self.rows, self.cols, pieces=PieceStream(self.rng.getrandbits(64), self.bag))
+
+    def restart(self, i: int) -> None:
+        self.games[i] = self._start()
+
+    def step(self, gravity: bool, actions):
+        """Apply (game, code, x) actions; [(game, flags), ...] for the reply."""
+        games = self.games
+        out = []
+        for i, code, x in actions:
+            game = games[i]
+            action = decode_action(code, x)
+            if not game.end:
+                game.step(() if action is None else (action,), gravity=gravity)
+            flags = ENDED if game.end else 0
+            if game.end and self.auto_reset:
+                out.append((i, flags | RESET, game.score))
+                self.restart(i)
+            else:
+                out.append((i, flags))
+        return out
+
+    def observation(self, i: int, flags: int = 0, score=None) -> bytes:
+        game = self.games[i]
+        # every reply type reports a finished game, not just step replies
+        if game.end:
+            flags |= ENDED
+        fig = game.fig
+        nxt = game.next
+        row_bytes = (self.cols + 7) // 8
+        header = _OBS.pack(
+            i, flags, game.score if score is None else score, game.lvl,
+            _TYPES[fig.type] if fig else 0xFF, fig.rotation if fig else 0,
+            fig.x if fig else 0, fig.y if fig else 0,
+            _TYPES[nxt.type] if nxt else 0xFF)
+        return header + b"".join(row.to_bytes(row_bytes, "little") for row in board_rows(game))
+
+    def batch(self, entries) -> bytes:
+        parts = [b"O", _COUNT.pack(len(entries))]
+        for entry in entries:
+            parts.append(self.observation(*entry))
+        return b"".join(parts)
+
+    def _ids(self, payload: bytes):
+        (n,) = _COUNT.unpack_from(payload, 1)
+        if n == 0:
+            return list(range(len(self.games)))
+        ids = struct.unpack_from("<%dH" % n, payload, 1 + _COUNT.size)
+        for i in ids:
+            if i >= len(self.games):
+                raise ValueError("no game %d" % i)
+        return list(ids)
+
+    def handle(self, payload: bytes) -> bytes:
+        """The reply to one request."""
+        kind = payload[:1]
+        if kind == b"N":
+            count, seed, rows, cols, bag, auto_reset = _NEW.unpack_from(payload, 1)
+            if not 4 <= rows <= 64 or not 4 <= cols <= 64:
+                raise ValueError("board size out of range")
+            if len(self.games) + count > 0xFFFF:
+                raise ValueError("too many games")
+            return self.batch(self.new_games(count, seed, rows, cols, bool(bag), bool(auto_reset)))
+        if kind == b"S":
+            gravity, n = _STEP.unpack_from(payload, 1)
+            actions = list(_ACTION.iter_unpack(payload[1 + _STEP.size:1 + _STEP.size + n * _ACTION.size]))
+            if len(actions) != n:
+                raise ValueError("truncated step message")
+            for i, code, x in actions:
+                if i >= len(self.games):
+                    raise ValueError("no game %d" % i)
+                decode_action(code, x)
+            return self.batch(self.step(bool(gravity), actions))
+        if kind == b"O":
+            return self.batch([(i,) for i in self._ids(payload)])
+        if kind == b"R":
+            ids = self._ids(payload)
+            for i in ids:
+                self.restart(i)
+            return self.batch([(i,) for i in ids])
+        raise ValueError("unknown message %r" % kind)
+
+
+class GameServer:
+    """asyncio server handing every connection a `Session` of `cls` games."""
+
+    def __init__(self, cls=BitboardTetris) -> None:
+        self.cls = cls
+        self.server = None
+
+    async def handle(self, reader, writer) -> None:
+        session = Session(self.cls)
+        try:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    return
+                try:
+                    reply = session.handle(payload)
+                except (ValueError, struct.error) as e:
+                    reply = b"E" + str(e).encode()
+                writer.write(_LENGTH.pack(len(reply)) + reply)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 7777, unix: str = None):
+        if unix:
+            self.server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 7777, unix: str = None) -> None:
+        server = await self.start(host, port, unix)
+        async with server:
+            await server.serve_forever()
+
+
+class GameClient:
+    """
+    Blocking client. Observations come back as dicts with game, end,
+    reset, score, lvl, piece (type, rotation, x, y) or None, next (type)
+    or None and board (one int per row, see board_rows()).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7777, unix: str = None) -> None:
+        if unix:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+        self.rows = ROWS
+        self.cols = COLS
+
+    def request(self, payload: bytes) -> bytes:
+        self.sock.sendall(_LENGTH.pack(len(payload)) + payload)
+        (length,) = _LENGTH.unpack(self._read(_LENGTH.size))
+        reply = self._read(length)
+        if reply[:1] == b"E":
+            raise ValueError(reply[1:].decode())
+        return reply
+
+    def _read(self, n: int) -> bytes:
+        data = self.file.read(n)
+        if len(data) != n:
+            raise ConnectionError("server closed the connection")
+        return data
+
+    def _observations(self, reply: bytes):
+        (n,) = _COUNT.unpack_from(reply, 1)
+        row_bytes = (self.cols + 7) // 8
+        size = _OBS.size + self.rows * row_bytes
+        out = []
+        offset = 1 + _COUNT.size
+        for _ in range(n):
+            game, flags, score, lvl, piece, rotation, x, y, nxt = _OBS.unpack_from(reply, offset)
+            start = offset + _OBS.size
+            board = [int.from_bytes(reply[start + r * row_bytes:start + (r + 1) * row_bytes], "little")
+                     for r in range(self.rows)]
+            out.append({
+                "game": game,
+                "end": bool(flags & ENDED),
+                "reset": bool(flags & RESET),
+                "score": score,
+                "lvl": lvl,
+                "piece": None if piece == 0xFF else (shape.shapes[piece], rotation, x, y),
+                "next": None if nxt == 0xFF else shape.shapes[nxt],
+                "board": board,
+            })
+            offset += size
+        return out
+
+    def new(self, count: int, seed: int = 0, rows: int = ROWS, cols: int = COLS,
+            bag: bool = False, auto_reset: bool = False):
+        reply = self.request(b"N" + _NEW.pack(count, seed, rows, cols, bag, auto_reset))
+        # only once the server accepted the size, so a rejected request
+        # leaves the client reading replies the way it did before
+        self.rows, self.cols = rows, cols
+        return self._observations(reply)
+
+    def step(self, actions, gravity: bool = False):
+        """
+        Apply one action per game, `actions` being a dict or (game, action)
+        pairs of engine actions (see encode_action()).
+        """
+        items = actions.items() if isinstance(actions, dict) else actions
+        body = [b"S", _STEP.pack(gravity, len(items))]
+        for game, action in items:
+            body.append(_ACTION.pack(game, *encode_action(action)))
+        return self._observations(self.request(b"".join(body)))
+
+    def _select(self, kind: bytes, games):
+        games = list(games or ())
+        return self._observations(self.request(
+            kind + _COUNT.pack(len(games)) + struct.pack("<%dH" % len(games), *games)))
+
+    def observe(self, games=None):
+        """Observations of `games`, or of every game."""
+        return self._select(b"O", games)
+
+    def reset(self, games=None):
+        """Restart `games`, or every game, with fresh seeds."""
+        return self._select(b"R", games)
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve headless Tetris games to remote bots.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    args = parser.parse_args(argv)
+    if args.unix and os.path.exists(args.unix):
+        os.remove(args.unix)
+    try:
+        asyncio.run(GameServer().serve_forever(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,18 @@
+import atexit
 import pygame
-import random
 import sys
 import os
-from player.player import Grid
-
-pygame.init()
+from tetris import engine
+from tetris.bitboard import BitboardTetris
+from tetris.engine import GEOMETRY, PieceStream, shape
+from tetris.profiler import PROFILER
+from tetris.replay import ReplayWriter
 
 height, width = 500, 300
 cell = 20
 rows = (height - 120) // cell
 cols = width // cell
 
-screen = pygame.display.set_mode((width, height))
-clock = pygame.time.Clock()
-pygame.display.set_caption("Auto-cognito")
-
 black = (0, 0, 0)
 white = (255, 255, 255)
 lose = (252, 91, 122)
@@ -24,210 +22,279 @@ grid_color = (100, 100, 255)
 
 assets_path = os.path.join(os.path.dirname(__file__), "assets")
 
-assets = {
-    1: pygame.image.load(os.path.join(assets_path, "1.png")).convert_alpha(),
-    2: pygame.image.load(os.path.join(assets_path, "2.png")).convert_alpha(),
-    3: pygame.image.load(os.path.join(assets_path, "3.png")).convert_alpha(),
-    4: pygame.image.load(os.path.join(assets_path, "4.png")).convert_alpha(),
-}
-
-font = pygame.font.SysFont("verdana", 50)
-font_2 = pygame.font.SysFont("verdana", 15)
-
-
-class shape:
-    version = {
-        "I": [[1, 5, 9, 13], [4, 5, 6, 7]],
-        "Z": [[4, 5, 9, 10], [2, 6, 5, 9]],
-        "S": [[6, 7, 9, 10], [1, 5, 6, 10]],
-        "L": [[1, 2, 5, 9], [0, 4, 5, 6], [1, 5, 9, 8], [4, 5, 6, 10]],
-        "J": [[1, 2, 6, 10], [5, 6, 7, 9], [2, 6, 10, 11], [3, 5, 6, 7]],
-        "T": [[1, 4, 5, 6], [1, 4, 5, 9], [4, 5, 6, 9], [1, 5, 6, 9]],
-        "O": [[1, 2, 5, 6]],
-    }
-    shapes = ["I", "Z", "S", "L", "J", "T", "O"]
-
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.type = random.choice(self.shapes)
-        self.shape = self.version[self.type]
-        self.color = random.randint(1, 4)
-        self.rotation = 0
-
-    def img(self):
-        return self.shape[self.rotation]
-
-    def rotate(self):
-        self.rotation = (self.rotation + 1) % len(self.shape)
-
-
-class tetris:
-    def __init__(self, rows, cols):
-        self.grid = [[0 for _ in range(cols)] for _ in range(rows)]
-        self.current_shape = None
-        self.rows = rows
-        self.cols = cols
-        self.lvl = 1
-        self.next = None
-        self.end = False
-        self.score = 0
-        self.new_shape()
-
-    def make_grid(self):
+# window, clock, piece assets and fonts, made by init_display() so that
+# importing this module does not open a window
+screen = None
+clock = None
+assets = {}
+font = font_2 = font_3 = None
+
+
+def init_display() -> None:
+    """Start pygame and open the game window. Safe to call more than once."""
+    global screen, clock, font, font_2, font_3
+    if screen is not None:
+        return
+    pygame.init()
+    screen = pygame.display.set_mode((width, height))
+    clock = pygame.time.Clock()
+    pygame.display.set_caption("Auto-cognito")
+
+    for color in (1, 2, 3, 4):
+        assets[color] = pygame.image.load(os.path.join(assets_path, "%d.png" % color)).convert_alpha()
+
+    font = pygame.font.SysFont("verdana", 50)
+    font_2 = pygame.font.SysFont("verdana", 15)
+    font_3 = pygame.font.SysFont("verdana", 11)
+
+
+class _Drawing:
+    """Pygame drawing helpers shared by every board backend."""
+
+    def make_grid(self, surface=None):
+        surface = surface or screen
         for i in range(self.rows + 1):
-            pygame.draw.line(screen, grid_color, (0, cell * i), (width, cell * i))
+            pygame.draw.line(surface, grid_color, (0, cell * i), (width, cell * i))
         for i in range(self.cols + 1):
             pygame.draw.line(
-                screen, grid_color, (cell * i, 0), (cell * i, height - 120)
+                surface, grid_color, (cell * i, 0), (cell * i, height - 120)
             )
 
-    def new_shape(self):
-        if not self.next:
-            self.next = shape(5, 0)
-        self.fig = self.next
-        self.next = shape(5, 0)
-
-    def collision(self) -> bool:
-        if not self.fig:
-            return False
-        for i in range(4):
-            for j in range(4):
-                if (i * 4 + j) in self.fig.img():
-                    block_row = i + self.fig.y
-                    block_col = j + self.fig.x
-                    if (
-                        block_row >= self.rows
-                        or block_row < 0
-                        or block_col < 0
-                        or block_col >= self.cols
-                    ):
-                        return True
-                    if block_row >= 0 and self.grid[block_row][block_col] > 0:
-                        return True
-        return False
-
-    def remove_row(self):
-        rerun = False
-        for i in range(self.rows - 1, 0, -1):
-            completed = True
-            for j in range(0, self.cols):
-                if self.grid[i][j] == 0:
-                    completed = False
-
-            if completed:
-                del self.grid[i]
-                self.grid.insert(0, [0 for i in range(self.cols)])
-                self.score += 1
-
-                if self.score % 5 == 0:
-                    self.lvl += 1
-                rerun = True
-
-        if rerun:
-            self.remove_row()
-
-    def freeze(self):
-        for i in range(4):
-            for j in range(4):
-                if (i * 4 + j) in self.fig.img():
-                    self.grid[self.fig.y + i][self.fig.x + j] = self.fig.color
-
-        self.remove_row()
-        self.new_shape()
-        if self.collision():
-            self.end = True
-
-    def move(self):
-        self.fig.y += 1
-        if self.collision():
-            self.fig.y -= 1
-            self.freeze()
-
-    def left(self):
-        self.fig.x -= 1
-        if self.collision():
-            self.fig.x += 1
-
-    def right(self):
-        self.fig.x += 1
-        if self.collision():
-            self.fig.x -= 1
-
-    def freefall(self):
-        while not self.collision():
-            self.fig.y += 1
-        self.fig.y -= 1
-        self.freeze()
-
-    def fast_drop(self):
-        for _ in range(3):
-            self.fig.y += 1
-            if self.collision():
-                self.fig.y -= 1
-                break
-
-    def rotate(self):
-        old_rotation = self.fig.rotation
-        self.fig.rotate()
-        if self.collision():
-            self.fig.rotation = old_rotation
-            
-    def end_game(self):
+    def end_game(self, surface=None):
+        surface = surface or screen
         popup = pygame.Rect(50, 140, width - 100, height - 350)
-        pygame.draw.rect(screen, black, popup)
-        pygame.draw.rect(screen, lose, popup, 2)
+        pygame.draw.rect(surface, black, popup)
+        pygame.draw.rect(surface, lose, popup, 2)
 
         game_over = font_2.render("GAME OVER!", True, white)
         option1 = font_2.render("Press r to restart", True, lose)
         option2 = font_2.render("Press q to quit", True, lose)
 
-        screen.blit(game_over, (popup.centerx - game_over.get_width() / 2, popup.y + 20))
-        screen.blit(option1, (popup.centerx - option1.get_width() / 2, popup.y + 60))
-        screen.blit(option2, (popup.centerx - option2.get_width() / 2, popup.y + 100))
+        surface.blit(game_over, (popup.centerx - game_over.get_width() / 2, popup.y + 20))
+        surface.blit(option1, (popup.centerx - option1.get_width() / 2, popup.y + 60))
+        surface.blit(option2, (popup.centerx - option2.get_width() / 2, popup.y + 100))
+        return popup
+
+
+class Renderer:
+    """
+    Draws a game onto `screen`, repainting only what changed.
+
+    The grid lines are drawn once onto a background surface and the locked
+    cells onto a board layer that is redrawn only when the game's
+    `board_generation` changes. Cell tiles, the scaled piece assets and
+    text surfaces are made once. A frame restores the cells the falling
+    piece left from the board layer, draws the piece where it is now and
+    hands just those rectangles to pygame.display.update.
+
+    With a `profiler` the time spent drawing and in display.update is
+    recorded, and if it asks for an overlay its numbers are drawn over the
+    top of the field, refreshed every 30 frames.
+    """
+
+    def __init__(self, profiler=None):
+        self.field = pygame.Rect(0, 0, width, height - 120)
+        self.panel = pygame.Rect(0, height - 120, width, 120)
+        self.background = pygame.Surface((width, height)).convert()
+        self.background.fill(bg_color)
+        self.board = None
+        # locked cells get a white outline, the falling piece sits inside the grid lines
+        self.tiles = {}
+        self.piece_tiles = {}
+        for color, img in assets.items():
+            tile = img.copy()
+            pygame.draw.rect(tile, white, (0, 0, cell, cell), 1)
+            self.tiles[color] = tile
+            self.piece_tiles[color] = pygame.transform.scale(img, (cell - 2, cell - 2))
+        self.texts = {}
+        self.profiler = profiler
+        self.overlay = None
+        self.overlay_rect = pygame.Rect(0, 0, 0, 0)
+        self.overlay_frames = 0
+        self.reset()
+
+    def reset(self):
+        """Forget what is on screen, so the next draw() repaints everything."""
+        self.game = None
+        self.board_generation = None
+        self.piece_key = None
+        self.piece_rects = []
+        self.panel_key = None
+        self.ended = False
+
+    def text(self, font, text, color=white):
+        key = (id(font), text, color)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) > 64:
+                self.texts.clear()
+            surface = self.texts[key] = font.render(text, True, color)
+        return surface
+
+    def _draw_board(self, game):
+        if self.board is None:
+            game.make_grid(self.background)
+            self.board = self.background.copy()
+        board = self.board
+        board.blit(self.background, self.field, self.field)
+        tiles = self.tiles
+        for r, row in enumerate(game.grid):
+            for c, val in enumerate(row):
+                if val > 0:
+                    board.blit(tiles[val], (c * cell, r * cell))
+
+    def _draw_overlay(self, dirty, repaint):
+        self.overlay_frames -= 1
+        if self.overlay is None or self.overlay_frames <= 0:
+            self.overlay_frames = 30
+            lines = [font_3.render(line, True, white) for line in self.profiler.overlay_lines()]
+            step = font_3.get_linesize()
+            # the box only grows, so it always covers what it covered before
+            self.overlay_rect.size = (width, max(self.overlay_rect.h, step * len(lines) + 4))
+            self.overlay = pygame.Surface(self.overlay_rect.size).convert()
+            self.overlay.fill(black)
+            for i, line in enumerate(lines):
+                self.overlay.blit(line, (2, 2 + i * step))
+        elif not repaint and self.overlay_rect.collidelist(dirty) == -1:
+            return
+        screen.blit(self.overlay, self.overlay_rect)
+        dirty.append(self.overlay_rect)
+
+    def draw(self, game):
+        dirty = []
+        if game is not self.game:
+            self.reset()
+            self.game = game
+            repaint = True
+        else:
+            repaint = False
+
+        fig = game.fig
+        piece_key = fig and (fig.type, fig.rotation, fig.x, fig.y, fig.color)
+        board_changed = game.board_generation != self.board_generation
+        if board_changed:
+            self._draw_board(game)
+            self.board_generation = game.board_generation
+            screen.blit(self.board, self.field, self.field)
+            dirty.append(self.field)
+        elif piece_key != self.piece_key:
+            for rect in self.piece_rects:
+                screen.blit(self.board, rect, rect)
+            dirty.extend(self.piece_rects)
+
+        if board_changed or piece_key != self.piece_key:
+            self.piece_key = piece_key
+            self.piece_rects = []
+            if fig:
+                tile = self.piece_tiles[fig.color]
+                for i, j in GEOMETRY[fig.type][fig.rotation].cells:
+                    x = (fig.x + j) * cell
+                    y = (fig.y + i) * cell
+                    screen.blit(tile, (x + 1, y + 1))
+                    self.piece_rects.append(pygame.Rect(x, y, cell, cell))
+            dirty.extend(self.piece_rects)
+
+        nxt = game.next
+        panel_key = (nxt and (nxt.type, nxt.rotation, nxt.color), game.score, game.lvl)
+        if panel_key != self.panel_key:
+            self.panel_key = panel_key
+            screen.blit(self.background, self.panel, self.panel)
+            if nxt:
+                for i, j in GEOMETRY[nxt.type][nxt.rotation].cells:
+                    x = (nxt.x + j - 4) * cell
+                    y = (nxt.y + i) * cell + height - 100
+                    screen.blit(assets[nxt.color], (x, y))
+            score_txt = self.text(font, f"{game.score}")
+            lvl_txt = self.text(font_2, f"Level: {game.lvl}")
+            screen.blit(score_txt, (250 - score_txt.get_width() // 2, height - 120))
+            screen.blit(lvl_txt, (250 - score_txt.get_width() // 2, height - 30))
+            dirty.append(self.panel)
+
+        # the popup goes back on top whenever something under it was repainted
+        if game.end and (dirty or not self.ended):
+            dirty.append(game.end_game())
+        self.ended = game.end
+
+        profiler = self.profiler
+        if profiler:
+            if profiler.overlay:
+                self._draw_overlay(dirty, repaint)
+            profiler.lap("render")
+        if repaint:
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty)
+        if profiler:
+            profiler.lap("display")
+
+
+class tetris(_Drawing, engine.tetris):
+    pass
+
+
+class bitboard_tetris(_Drawing, BitboardTetris):
+    pass
+
 
 def dev_main():
-    from player.player import update_game_state
-    
+    from player.player import bot_tick, close_bot, commands, update_game_state
+    from player.send_cmd import CommandReader
+
+    init_display()
+    # stops the bot's decision thread and search processes on the way out
+    atexit.register(close_bot)
     run = True
-    game = tetris(rows, cols)
-    player_grid = Grid()
+    game_cls = bitboard_tetris if os.getenv("TETRIS_BOARD") == "bitboard" else tetris
+    # TETRIS_SEED replays the same pieces every game, TETRIS_BAG=1 deals them in 7-bags
+    try:
+        seed = int(os.getenv("TETRIS_SEED"))
+    except Exception:
+        seed = None
+    bag = os.getenv("TETRIS_BAG") == "1"
+    game = game_cls(rows, cols, pieces=PieceStream(seed, bag))
+    # TETRIS_RECORD=path records every game of the session (see tetris/replay.py)
+    recorder = None
+    if os.getenv("TETRIS_RECORD"):
+        recorder = ReplayWriter(os.getenv("TETRIS_RECORD"))
+        recorder.record(game)
+        atexit.register(recorder.close)
     cnt = 0
     move = True
-    space_press = False
     
     update_game_state(game)
     
-    last_keys = {pygame.K_LEFT: False, pygame.K_RIGHT: False, 
-                 pygame.K_DOWN: False, pygame.K_UP: False, pygame.K_SPACE: False}
+    # key -> action, applied once per press
+    key_actions = {pygame.K_LEFT: "left", pygame.K_RIGHT: "right",
+                   pygame.K_DOWN: "fast_drop", pygame.K_UP: "rotate",
+                   pygame.K_SPACE: "freefall"}
+    last_keys = {key: False for key in key_actions}
     
+    # TETRIS_PROFILE times every phase of the loop (see tetris/profiler.py)
+    profiler = PROFILER
+    renderer = Renderer(profiler)
+    # keys sent by external controllers through player/send_cmd.py
+    external = CommandReader()
     while run:
-        screen.fill(bg_color)
+        if profiler:
+            profiler.start_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
                 sys.exit()
+        if profiler:
+            profiler.lap("events")
         keys = pygame.key.get_pressed()
-        if not game.end:
-            if keys[pygame.K_LEFT] and not last_keys[pygame.K_LEFT]:
-                game.left()
-            elif keys[pygame.K_RIGHT] and not last_keys[pygame.K_RIGHT]:
-                game.right()
-            elif keys[pygame.K_DOWN] and not last_keys[pygame.K_DOWN]:
-                game.fast_drop()
-            elif keys[pygame.K_UP] and not last_keys[pygame.K_UP]:
-                game.rotate()
-            elif keys[pygame.K_SPACE] and not last_keys[pygame.K_SPACE]:
-                space_press = True
-        
-        last_keys[pygame.K_LEFT] = keys[pygame.K_LEFT]
-        last_keys[pygame.K_RIGHT] = keys[pygame.K_RIGHT]
-        last_keys[pygame.K_DOWN] = keys[pygame.K_DOWN]
-        last_keys[pygame.K_UP] = keys[pygame.K_UP]
-        last_keys[pygame.K_SPACE] = keys[pygame.K_SPACE]
+        for key, action in key_actions.items():
+            if keys[key] and not last_keys[key]:
+                commands.append(action)
+                break
+        for key in key_actions:
+            last_keys[key] = keys[key]
                 
         if keys[pygame.K_r] and game.end:
-            game.__init__(rows, cols)
+            game.__init__(rows, cols, pieces=PieceStream(seed, bag))
+            if recorder:
+                recorder.record(game)
 
         if keys[pygame.K_ESCAPE] or keys[pygame.K_q]:
             run = False
@@ -236,54 +303,24 @@ def dev_main():
         cnt += 1
         if cnt >= 1000:
             cnt = 0
-
-        if move:
-            if (cnt % (15 // game.lvl * 1.5)) == 0:
-                if not game.end:
-                    if space_press:
-                        game.freefall()
-                        space_press = False
-                    else:
-                        game.move()
-        game.make_grid()
-
-        for x in range(rows):
-            for y in range(cols):
-                if game.grid[x][y] > 0:
-                    val = game.grid[x][y]
-                    img = assets[val]
-                    screen.blit(img, (y * cell, x * cell))
-                    pygame.draw.rect(screen, white, (y * cell, x * cell, cell, cell), 1)
-        if game.fig:
-            for i in range(4):
-                for j in range(4):
-                    if (i * 4 + j) in game.fig.img():
-                        x = (game.fig.x + j) * cell
-                        y = (game.fig.y + i) * cell
-                        img = pygame.transform.scale(
-                            assets[game.fig.color], (cell - 2, cell - 2)
-                        )
-                        screen.blit(img, (x + 1, y + 1))
-
-        if game.next:
-            for i in range(4):
-                for j in range(4):
-                    if (i * 4 + j) in game.next.img():
-                        img = assets[game.next.color]
-                        x = (game.next.x + j - 4) * cell
-                        y = (game.next.y + i) * cell + height - 100
-                        screen.blit(img, (x, y))
-                        
-        if game.end:
-            game.end_game()
-
-        score_txt = font.render(f"{game.score}", True, white)
-        lvl_txt = font_2.render(f"Level: {game.lvl}", True, white)
-        screen.blit(score_txt, (250 - score_txt.get_width() // 2, height - 120))
-        screen.blit(lvl_txt, (250 - score_txt.get_width() // 2, height - 30))
-
-        pygame.display.update()
+        if profiler:
+            profiler.lap("input")
+
+        # everything queued this frame (keys, controllers and bot) is applied in one logic tick
+        commands.extend(external.drain())
+        bot_tick()
+        if profiler:
+            profiler.lap("bot")
+        actions = [commands.popleft() for _ in range(len(commands))]
+        if not game.end:
+            game.step(actions, gravity=move and (cnt % (15 // game.lvl * 1.5)) == 0)
+        if profiler:
+            profiler.lap("logic")
+        renderer.draw(game)
         clock.tick(60)
+        if profiler:
+            profiler.lap("sleep")
+            profiler.end_frame()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+"""
+K headless games stepped in lockstep, with NumPy observations.
+
+`VectorEnv` keeps every observation in arrays allocated once, indexed by
+game:
+
+    board        (K, rows, cols) uint8, 1 for a locked cell
+    piece        (K, 4) int16, falling piece: type, rotation, x, y
+    next_piece   (K,) int8, type of the next piece
+    score        (K,) int32, lines cleared so far
+    reward       (K,) float32, lines cleared by the last step
+    done         (K,) bool, the game ended in the last step
+    final_score  (K,) int32, score of the game that ended (where done)
+
+Piece types index `shape.shapes`. step() fills these in place and returns
+the same arrays every time, so copy them to keep one. A game's entries are
+only rewritten when its `generation` moved, and its board rows only when
+its `board_generation` did.
+
+Actions are the codes of `tetris/server.py`: 0-5 the engine inputs, NOOP,
+or PLACE | rotation with the target column in `x`. A game that ends is
+restarted straight away (auto-reset): `done` and `final_score` report the
+finished game, everything else already describes the new one. Piece seeds
+come from a random.Random seeded with `seed`, so the same seed and actions
+give the same games.
+
+    from tetris.server import PLACE
+
+    env = VectorEnv(64, seed=1)
+    board, piece, reward, done = env.step(np.full(64, PLACE, np.uint8), x=np.full(64, 5))
+"""
+import random
+
+import numpy as np
+
+from tetris.bitboard import BitboardTetris
+from tetris.engine import COLS, ROWS, PieceStream, shape
+from tetris.replay import ACTIONS
+from tetris.server import NOOP, PLACE, board_rows, decode_action
+
+_TYPES = {name: i for i, name in enumerate(shape.shapes)}
+_PLACE_CODES = frozenset(PLACE | rotation for rotation in range(4))
+_CODES = frozenset(range(len(ACTIONS))) | {NOOP} | _PLACE_CODES
+
+
+class VectorEnv:
+    def __init__(self, num_envs: int, seed: int = 0, rows: int = ROWS, cols: int = COLS,
+                 bag: bool = False, cls=BitboardTetris) -> None:
+        if cols > 62:
+            raise ValueError("boards wider than 62 columns are not supported")
+        self.num_envs = num_envs
+        self.rows = rows
+        self.cols = cols
+        self.bag = bag
+        self.cls = cls
+        self.rng = random.Random(seed)
+
+        self.board = np.zeros((num_envs, rows, cols), np.uint8)
+        self.piece = np.zeros((num_envs, 4), np.int16)
+        self.next_piece = np.zeros(num_envs, np.int8)
+        self.score = np.zeros(num_envs, np.int32)
+        self.reward = np.zeros(num_envs, np.float32)
+        self.done = np.zeros(num_envs, bool)
+        self.final_score = np.zeros(num_envs, np.int32)
+
+        # board rows are unpacked from the engine's row bits with two ufuncs
+        # writing into preallocated arrays. Copying the row bits in converts
+        # the engine's list to one small temporary array per board change;
+        # that is still faster than storing the rows one by one.
+        self._rowbits = np.zeros((num_envs, rows, 1), np.int64)
+        self._colmask = np.left_shift(1, np.arange(cols, dtype=np.int64))
+        self._cells = np.zeros((rows, cols), np.int64)
+        self._occupied = self.board.view(bool)
+
+        self.games = [None] * num_envs
+        self._generation = [None] * num_envs
+        self._board_generation = [None] * num_envs
+        self.reset()
+
+    def _start(self, i: int) -> None:
+        self.games[i] = self.cls(self.rows, self.cols,
+                                 pieces=PieceStream(self.rng.getrandbits(64), self.bag))
+        self._generation[i] = None
+        self._board_generation[i] = None
+
+    def _sync(self, i: int) -> None:
+        game = self.games[i]
+        if game.generation == self._generation[i]:
+            return
+        self._generation[i] = game.generation
+        fig = game.fig
+        self.piece[i] = (_TYPES[fig.type], fig.rotation, fig.x, fig.y)
+        self.next_piece[i] = _TYPES[game.next.type]
+        self.score[i] = game.score
+        if game.board_generation != self._board_generation[i]:
+            self._board_generation[i] = game.board_generation
+            self._rowbits[i, :, 0] = board_rows(game)
+            np.bitwise_and(self._rowbits[i], self._colmask, out=self._cells)
+            np.not_equal(self._cells, 0, out=self._occupied[i])
+
+    def reset(self):
+        """Restart every game; returns (board, piece)."""
+        for i in range(self.num_envs):
+            self._start(i)
+            self._sync(i)
+        self.reward.fill(0)
+        self.done.fill(False)
+        self.final_score.fill(0)
+        return self.board, self.piece
+
+    def step(self, actions, x=None, gravity: bool = False):
+        """
+        Apply actions[i] (and x[i] for PLACE codes) to game i, then gravity
+        if set, like engine.tetris.step(). Returns (board, piece, reward, done).
+        """
+        codes = actions.tolist() if hasattr(actions, "tolist") else list(actions)
+        if len(codes) != self.num_envs:
+            raise ValueError("expected %d actions, got %d" % (self.num_envs, len(codes)))
+        # checked up front, so a bad batch leaves every game as it was
+        used = set(codes)
+        if not used <= _CODES:
+            raise ValueError("unknown action code %r" % min(used - _CODES))
+        xs = x.tolist() if hasattr(x, "tolist") else x
+        if xs is None and not used.isdisjoint(_PLACE_CODES):
+            raise ValueError("PLACE actions need x")
+        games = self.games
+        reward = self.reward
+        done = self.done
+        for i, code in enumerate(codes):
+            game = games[i]
+            before = game.score
+            if code < len(ACTIONS):
+                game.step((ACTIONS[code],), gravity)
+            elif code == NOOP:
+                game.step((), gravity)
+            else:
+                game.step((decode_action(code, xs[i]),), gravity)
+            reward[i] = game.score - before
+            if game.end:
+                done[i] = True
+                self.final_score[i] = game.score
+                self._start(i)
+            else:
+                done[i] = False
+            self._sync(i)
+        return self.board, self.piece, reward, done
+
+    def close(self) -> None:
+        self.games = [None] * self.num_envs